@@ -2,56 +2,121 @@ import os
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect
 from sqlalchemy.orm import DeclarativeBase
+from database import get_database_url, get_engine_options, configure_engine, upgrade_schema
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (LOG_LEVEL=DEBUG for verbose output)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "fallback_secret_key_for_development")
+def create_app(start_workers=None):
+    """Build the Flask app.
 
-# Configure the SQLite database
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///attendance_system.db"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+    Creating the app does not touch the schema; run `flask --app main init-db`
+    once (and after upgrades) to create the tables and the default admin.
+    Background workers start only in processes that serve requests (see
+    serves_requests) unless start_workers says otherwise.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "fallback_secret_key_for_development")
 
-# Initialize the app with the extension
-db.init_app(app)
+    # Configure the database (DATABASE_URL, SQLite by default)
+    database_url = get_database_url()
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = get_engine_options(database_url)
 
-with app.app_context():
-    # Import models to ensure tables are created
+    # Initialize the app with the extension
+    db.init_app(app)
+
+    with app.app_context():
+        configure_engine(db.engine)
+
+        # Per-request latency and SQL instrumentation, served on /metrics
+        from metrics import init_metrics
+        init_metrics(app, db.engine)
+
+    # Register routes
+    from routes import bp
+    app.register_blueprint(bp)
+
+    # Register CLI commands
+    from cli import register_commands
+    register_commands(app)
+
+    from live_stats import live_stats
+    live_stats.init_app(app)
+
+    if start_workers is None:
+        start_workers = serves_requests()
+    if start_workers:
+        start_background_workers(app)
+
+    return app
+
+def serves_requests():
+    """False for `flask` commands other than `flask run`, and for the
+    watcher process of `flask run --reload`, which only restarts the server"""
+    if os.environ.get("FLASK_RUN_FROM_CLI") != "true":
+        return True
+
+    import click
+    from flask.helpers import get_debug_flag
+    from werkzeug.serving import is_running_from_reloader
+    ctx = click.get_current_context(silent=True)
+    if ctx is None or ctx.info_name != 'run':
+        return False
+    reload = ctx.params.get('reload')
+    if reload is None:
+        reload = get_debug_flag()
+    return not reload or is_running_from_reloader()
+
+def start_background_workers(app):
+    """Start the write-behind flusher, the mail queue worker and the job scheduler"""
+    # Attendance write-behind flusher (ATTENDANCE_WRITE_BEHIND=1)
+    from write_behind import write_behind_queue
+    if write_behind_queue is not None:
+        import atexit
+        write_behind_queue.start(app)
+        atexit.register(write_behind_queue.stop)
+
+    # Outbound mail queue worker
+    from mail_queue import start_mail_worker
+    start_mail_worker(app)
+
+    # Job scheduler; only the process holding the leader lease runs jobs
+    try:
+        from scheduler import start_scheduler
+        start_scheduler(app)
+    except Exception as e:
+        logging.error(f"Failed to start job scheduler: {e}")
+
+def init_db():
+    """Create missing tables and columns and the default admin user (needs an app context)"""
     import models
     db.create_all()
-    
+    attendance_indexes = {index['name'] for index in inspect(db.engine).get_indexes(models.Attendance.__tablename__)}
+    if 'uq_attendance_user_date' not in attendance_indexes:
+        # Older databases may hold double scans that would block the unique index
+        from attendance_service import remove_duplicate_attendance
+        remove_duplicate_attendance()
+    upgrade_schema(db.engine, db.metadata)
+
     # Create default admin user if not exists
     from models import User
     admin = User.query.filter_by(username='admin').first()
     if not admin:
-        from werkzeug.security import generate_password_hash
+        from passwords import hash_password
         admin_user = User(
             username='admin',
             email='admin@college.edu',
-            password_hash=generate_password_hash('admin123'),
+            password_hash=hash_password('admin123'),
             role='admin'
         )
         db.session.add(admin_user)
         db.session.commit()
         logging.info("Default admin user created")
-
-# Import routes
-from routes import *
-
-# Start email scheduler
-try:
-    import scheduler
-    logging.info("Email scheduler imported and started")
-except Exception as e:
-    logging.error(f"Failed to start email scheduler: {e}")
@@ -0,0 +1,102 @@
+"""
+A faculty member's own attendance history.
+
+Pages are fetched with keyset pagination on (user_id, date): each page asks
+for the rows before the last date of the previous one, which the unique
+(user_id, date) index answers directly, so page 50 costs the same as page 1.
+Monthly summaries are grouped in SQL.
+
+Responses carry an ETag built from the user's row count and highest
+attendance id, read with one aggregate over the same index, so a client that
+already has the current version gets a 304 without any page or summary
+queries.
+
+History requests share at most HISTORY_MAX_CONCURRENT slots per worker, so a
+burst of browsing cannot take every thread away from the 9:30 scan requests.
+"""
+import os
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+from sqlalchemy import extract, func
+from app import db
+from models import Attendance, User
+from attendance_policy import attendance_policy, ist_today, ist_date, utc_to_ist
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "30"))
+HISTORY_MAX_PAGE_SIZE = 100
+HISTORY_SUMMARY_MONTHS = int(os.getenv("HISTORY_SUMMARY_MONTHS", "12"))
+HISTORY_MAX_CONCURRENT = int(os.getenv("HISTORY_MAX_CONCURRENT", "4"))
+
+# One day's attendance; scan_time is an aware IST datetime
+HistoryEntry = namedtuple('HistoryEntry', ['date', 'scan_time', 'status'])
+# next_before is the cursor for the following (older) page, or None on the last page
+HistoryPage = namedtuple('HistoryPage', ['entries', 'next_before'])
+MonthSummary = namedtuple('MonthSummary', ['year', 'month', 'present_days', 'working_days', 'attendance_rate'])
+
+history_slots = threading.BoundedSemaphore(HISTORY_MAX_CONCURRENT)
+
+def history_version(user_id):
+    """(row count, highest id) of a user's attendance; changes whenever a row is added or removed"""
+    count, max_id = db.session.query(func.count(Attendance.id), func.max(Attendance.id)).filter(
+        Attendance.user_id == user_id
+    ).one()
+    return count, max_id or 0
+
+def history_etag(user_id, *extra):
+    """ETag value for a user's history; extra distinguishes views that depend on more than the rows"""
+    count, max_id = history_version(user_id)
+    return '-'.join(str(part) for part in ('h', user_id, count, max_id) + extra)
+
+def history_page(user_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """Up to limit days of attendance, newest first, strictly before the date `before`"""
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    query = db.session.query(Attendance.date, Attendance.scan_time, Attendance.status).filter(
+        Attendance.user_id == user_id
+    )
+    if before is not None:
+        query = query.filter(Attendance.date < before)
+    # One extra row tells us whether there is another page
+    rows = query.order_by(Attendance.date.desc()).limit(limit + 1).all()
+
+    entries = [
+        HistoryEntry(row.date, utc_to_ist(row.scan_time), row.status or 'present')
+        for row in rows[:limit]
+    ]
+    next_before = entries[-1].date if len(rows) > limit else None
+    return HistoryPage(entries, next_before)
+
+def monthly_summaries(user_id, months=HISTORY_SUMMARY_MONTHS):
+    """Present days per month for the last `months` months (newest first), counted in SQL.
+
+    Working days before the user registered are not counted.
+    """
+    today = ist_today()
+    first_month = today.year * 12 + today.month - 1 - (months - 1)
+    since = date(first_month // 12, first_month % 12 + 1, 1)
+    created_at = db.session.query(User.created_at).filter(User.id == user_id).scalar()
+    registered_on = ist_date(created_at) if created_at else since
+
+    year = extract('year', Attendance.date)
+    month = extract('month', Attendance.date)
+    present = {
+        (int(row_year), int(row_month)): present_days
+        for row_year, row_month, present_days in db.session.query(
+            year, month, func.count(Attendance.id)
+        ).filter(
+            Attendance.user_id == user_id,
+            Attendance.date >= since
+        ).group_by(year, month)
+    }
+
+    summaries = []
+    for index in range(first_month + months - 1, first_month - 1, -1):
+        summary_year, summary_month = index // 12, index % 12 + 1
+        start = date(summary_year, summary_month, 1)
+        month_end = date(summary_year + (summary_month == 12), summary_month % 12 + 1, 1) - timedelta(days=1)
+        # Only days that have happened so far, since registration, can be missed
+        working_days = attendance_policy.working_days(max(start, registered_on), min(month_end, today))
+        present_days = present.get((summary_year, summary_month), 0)
+        rate = round(min(present_days, working_days) / working_days * 100, 1) if working_days else 0.0
+        summaries.append(MonthSummary(summary_year, summary_month, present_days, working_days, rate))
+    return summaries
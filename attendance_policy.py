@@ -0,0 +1,225 @@
+"""
+When attendance can be marked: the daily scan window, per-department
+windows, weekends and holidays.
+
+The policy lives in a JSON file (ATTENDANCE_POLICY_FILE, by default
+instance/attendance_policy.json) and is reloaded when the file changes, so
+windows and holidays can be edited without a redeploy:
+
+    {
+        "window": {"start": "09:30", "end": "09:45"},
+        "departments": {"Physics": {"start": "10:00", "end": "10:15"}},
+        "weekends": ["sunday"],
+        "holidays": ["2026-01-26", "2026-08-15"]
+    }
+
+Every key is optional; without a file the window is 9:30-9:45 AM IST every
+day. Times are IST and both ends of a window are inclusive.
+
+The window boundaries for the current IST day are computed once per day (and
+after a reload), so is_open() is a dictionary lookup and two comparisons.
+"""
+import json
+import os
+import threading
+import time as _time
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+import pytz
+import logging
+
+# Indian Standard Time
+IST = pytz.timezone('Asia/Kolkata')
+
+ATTENDANCE_POLICY_FILE = os.getenv(
+    "ATTENDANCE_POLICY_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'attendance_policy.json'))
+# How often the policy file is checked for changes
+ATTENDANCE_POLICY_RELOAD_SECONDS = int(os.getenv("ATTENDANCE_POLICY_RELOAD_SECONDS", "10"))
+
+DEFAULT_WINDOW = (time(9, 30), time(9, 45))
+WEEKDAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Parsed policy file. Department names are matched case-insensitively.
+PolicyConfig = namedtuple('PolicyConfig', ['window', 'departments', 'weekends', 'holidays'])
+# A day's scan window as aware IST datetimes
+Window = namedtuple('Window', ['start', 'end'])
+
+DEFAULT_CONFIG = PolicyConfig(DEFAULT_WINDOW, {}, frozenset(), frozenset())
+
+def ist_now():
+    return datetime.now(IST)
+
+def ist_today():
+    """Today's date in IST, the key for QR codes, attendance and reports"""
+    return ist_now().date()
+
+def ist_date(timestamp):
+    """IST date of a naive UTC timestamp as stored by the database"""
+    return pytz.UTC.localize(timestamp).astimezone(IST).date()
+
+def utc_to_ist(timestamp):
+    """Aware IST datetime of a naive UTC timestamp, or None"""
+    if timestamp is None:
+        return None
+    return pytz.UTC.localize(timestamp).astimezone(IST)
+
+def format_time(value):
+    return value.strftime('%I:%M %p').lstrip('0')
+
+def _parse_window(spec, where):
+    try:
+        start = datetime.strptime(spec['start'], '%H:%M').time()
+        end = datetime.strptime(spec['end'], '%H:%M').time()
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"{where} needs \"start\" and \"end\" as HH:MM")
+    if end < start:
+        raise ValueError(f"{where} ends before it starts")
+    return start, end
+
+def _field(data, key, kind, default):
+    value = data.get(key, default)
+    if not isinstance(value, kind):
+        raise ValueError(f"\"{key}\" must be a JSON {'object' if kind is dict else 'list'}")
+    return value
+
+def parse_policy(data):
+    """Build a PolicyConfig from the decoded JSON. Raises ValueError on bad values."""
+    if not isinstance(data, dict):
+        raise ValueError("The policy must be a JSON object")
+    window = _parse_window(data['window'], 'window') if 'window' in data else DEFAULT_WINDOW
+    departments = {
+        str(name).strip().casefold(): _parse_window(spec, f"window for {name}")
+        for name, spec in _field(data, 'departments', dict, {}).items()
+    }
+    weekends = set()
+    for name in _field(data, 'weekends', list, []):
+        if str(name).lower() not in WEEKDAY_NAMES:
+            raise ValueError(f"Unknown weekday {name}")
+        weekends.add(WEEKDAY_NAMES.index(str(name).lower()))
+    holidays = set()
+    for day in _field(data, 'holidays', list, []):
+        if not isinstance(day, str):
+            raise ValueError(f"Holiday {day} must be a YYYY-MM-DD string")
+        holidays.add(date.fromisoformat(day))
+    return PolicyConfig(window, departments, frozenset(weekends), frozenset(holidays))
+
+class AttendancePolicy:
+    """The attendance rules, reloaded from path whenever the file changes"""
+
+    def __init__(self, path=ATTENDANCE_POLICY_FILE, reload_seconds=ATTENDANCE_POLICY_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.config = DEFAULT_CONFIG
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = None
+        # (day, {department key or None: Window}) for the current IST day
+        self._day_windows = (None, {})
+
+    def _maybe_reload(self):
+        now = _time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.reload_seconds:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.reload_seconds:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                mtime = None
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+
+            if mtime is None:
+                self.config = DEFAULT_CONFIG
+                logging.info("No attendance policy file; using the default 9:30-9:45 AM window")
+            else:
+                try:
+                    with open(self.path) as f:
+                        self.config = parse_policy(json.load(f))
+                    logging.info(f"Loaded attendance policy from {self.path}")
+                except (OSError, ValueError) as e:
+                    # Keep the rules we had rather than locking everyone out
+                    logging.error(f"Invalid attendance policy {self.path}, keeping the previous one: {e}")
+            self._day_windows = (None, {})
+
+    @property
+    def version(self):
+        """Changes whenever the policy file changes, e.g. for cache validators"""
+        self._maybe_reload()
+        return int(self._mtime or 0)
+
+    def is_working_day(self, day):
+        self._maybe_reload()
+        return day.weekday() not in self.config.weekends and day not in self.config.holidays
+
+    def working_days(self, start_date, end_date):
+        """Number of working days from start_date to end_date inclusive"""
+        self._maybe_reload()
+        total = 0
+        day = start_date
+        while day <= end_date:
+            if day.weekday() not in self.config.weekends and day not in self.config.holidays:
+                total += 1
+            day += timedelta(days=1)
+        return total
+
+    def window_times(self, department=None):
+        """(start, end) times of the window for a department"""
+        self._maybe_reload()
+        if department:
+            window = self.config.departments.get(department.strip().casefold())
+            if window:
+                return window
+        return self.config.window
+
+    def _compute_windows(self, day):
+        if day.weekday() in self.config.weekends or day in self.config.holidays:
+            return {}
+
+        def window(start, end):
+            return Window(IST.localize(datetime.combine(day, start)), IST.localize(datetime.combine(day, end)))
+
+        windows = {None: window(*self.config.window)}
+        for key, times in self.config.departments.items():
+            windows[key] = window(*times)
+        return windows
+
+    def _windows_for(self, day):
+        self._maybe_reload()
+        cached_day, windows = self._day_windows
+        if cached_day != day:
+            windows = self._compute_windows(day)
+            if day == ist_today():
+                self._day_windows = (day, windows)
+        return windows
+
+    def window_for(self, day, department=None):
+        """A day's Window for a department, or None on weekends and holidays"""
+        windows = self._windows_for(day)
+        if department:
+            window = windows.get(department.strip().casefold())
+            if window:
+                return window
+        return windows.get(None)
+
+    def is_open(self, now=None, department=None):
+        """True if attendance can be marked at now (default: the current time)"""
+        now = now.astimezone(IST) if now else ist_now()
+        window = self.window_for(now.date(), department)
+        return window is not None and window.start <= now <= window.end
+
+    def latest_close(self, day):
+        """When the last window closes on a day, or None if no attendance is taken"""
+        windows = self._windows_for(day)
+        return max((window.end for window in windows.values()), default=None)
+
+    def describe(self, department=None):
+        """The window as display text, e.g. '9:30 AM - 9:45 AM'"""
+        start, end = self.window_times(department)
+        return f"{format_time(start)} - {format_time(end)}"
+
+attendance_policy = AttendancePolicy()
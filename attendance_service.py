@@ -0,0 +1,72 @@
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from app import db
+from database import UPSERT_INSERTS
+from models import Attendance
+import logging
+
+def insert_attendance_rows(rows):
+    """Insert attendance rows, skipping any (user_id, date) that already exists.
+
+    Returns the number of rows actually inserted.
+    """
+    dialect = db.session.get_bind().dialect.name
+    dialect_insert = UPSERT_INSERTS.get(dialect)
+
+    if dialect_insert is not None:
+        stmt = dialect_insert(Attendance).values(rows).on_conflict_do_nothing(
+            index_elements=['user_id', 'date']
+        )
+        return db.session.execute(stmt).rowcount
+
+    # Other databases: rely on the unique index and treat a violation as a duplicate
+    inserted = 0
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Attendance).values(**row))
+            inserted += 1
+        except IntegrityError:
+            pass
+    return inserted
+
+def mark_attendance(user_id, qr_code_id, attendance_date, status='present'):
+    """Mark attendance with a single insert-or-conflict statement.
+
+    Returns True if the row was inserted, False if the user had already
+    been marked for that date.
+    """
+    inserted = insert_attendance_rows([{
+        'user_id': user_id,
+        'qr_code_id': qr_code_id,
+        'date': attendance_date,
+        'status': status,
+    }])
+    db.session.commit()
+
+    if not inserted:
+        logging.debug(f"Attendance already marked for user {user_id} on {attendance_date}")
+    return bool(inserted)
+
+def remove_duplicate_attendance():
+    """Delete all but the earliest scan of each (user_id, date).
+
+    Databases created before the unique (user_id, date) index can hold
+    double-inserted rows, which would stop the index from being built.
+    Returns the number of rows deleted.
+    """
+    duplicates = db.session.query(Attendance.user_id, Attendance.date).group_by(
+        Attendance.user_id, Attendance.date
+    ).having(db.func.count(Attendance.id) > 1).all()
+
+    deleted = 0
+    for user_id, attendance_date in duplicates:
+        ids = [attendance_id for (attendance_id,) in db.session.query(Attendance.id).filter_by(
+            user_id=user_id, date=attendance_date
+        ).order_by(Attendance.scan_time, Attendance.id)]
+        deleted += Attendance.query.filter(Attendance.id.in_(ids[1:])).delete(synchronize_session=False)
+    db.session.commit()
+
+    if deleted:
+        logging.warning(f"Removed {deleted} duplicate attendance rows")
+    return deleted
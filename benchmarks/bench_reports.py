@@ -0,0 +1,130 @@
+"""
+Benchmark daily report rendering at different staff sizes.
+
+Builds synthetic ReportDatasets (no database needed) and times
+generate_excel_report, generate_pdf_report and generate_html_report at 100,
+1,000 and 10,000 faculty. Results are compared against the baseline stored
+in benchmarks/baseline.json.
+
+    python benchmarks/bench_reports.py                    # compare with baseline
+    python benchmarks/bench_reports.py --update-baseline  # record new baseline
+    python benchmarks/bench_reports.py --sizes 100 1000 --tolerance 1.5
+
+Exits with status 1 when any timing is more than --tolerance times its
+baseline and at least --min-delta-ms slower. Timings depend on the machine,
+so refresh the baseline when moving to different hardware.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import date, datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from report_render import (ReportRow, ReportDataset, format_scan_time,
+                           generate_excel_report, generate_pdf_report, generate_html_report)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_SIZES = [100, 1000, 10000]
+RENDERERS = {
+    'excel': generate_excel_report,
+    'pdf': generate_pdf_report,
+    'html': generate_html_report,
+}
+
+
+def make_dataset(faculty_count, present_ratio=0.85):
+    """A daily report where present_ratio of the staff scanned between 9:30 and 9:45"""
+    present_count = int(faculty_count * present_ratio)
+    present = [
+        ReportRow(f'Faculty Member {i}', f'faculty{i}', f'Department {i % 12}', 'Present',
+                  format_scan_time(datetime(2025, 1, 6, 4, i % 15, i % 60)))
+        for i in range(present_count)
+    ]
+    absent = [
+        ReportRow(f'Faculty Member {i}', f'faculty{i}', f'Department {i % 12}', 'Absent', 'N/A')
+        for i in range(present_count, faculty_count)
+    ]
+    return ReportDataset(date(2025, 1, 6), present, absent)
+
+
+def time_renderer(renderer, dataset, repeat):
+    """Best of `repeat` runs, in seconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        renderer(dataset)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(sizes, repeat):
+    results = {}
+    for size in sizes:
+        dataset = make_dataset(size)
+        for name, renderer in RENDERERS.items():
+            # Large PDFs take seconds; one run is representative enough
+            runs = 1 if size >= 10000 else repeat
+            seconds = time_renderer(renderer, dataset, runs)
+            results[f'{name}_{size}'] = round(seconds, 6)
+            print(f"{name:>5} x {size:>6}: {seconds * 1000:9.1f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='fail when a timing exceeds baseline x tolerance')
+    parser.add_argument('--min-delta-ms', type=float, default=25.0,
+                        help='ignore slowdowns smaller than this, which are mostly noise')
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+
+    if args.update_baseline:
+        baseline = {
+            'machine': f"{platform.python_implementation()} {platform.python_version()} on {platform.machine()}",
+            'recorded': date.today().isoformat(),
+            'seconds': results,
+        }
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline recorded; run with --update-baseline")
+        return 0
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)['seconds']
+
+    regressions = []
+    for key, seconds in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        ratio = seconds / expected if expected else 1.0
+        slower_ms = (seconds - expected) * 1000
+        marker = '  REGRESSION' if ratio > args.tolerance and slower_ms > args.min_delta_ms else ''
+        print(f"{key:>14}: {ratio:5.2f}x baseline{marker}")
+        if marker:
+            regressions.append(key)
+
+    if regressions:
+        print(f"{len(regressions)} timing(s) regressed beyond {args.tolerance}x: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""
+Simulate the 9:30 AM scan burst against the real application routes.
+
+Seeds N faculty accounts and today's QR code in a throwaway SQLite database,
+gives every faculty member a logged-in session, freezes the clock at 9:35 AM
+IST and fires concurrent POST /api/verify_qr requests, first through the
+Flask test client and then through a real threaded WSGI server.
+
+    python benchmarks/bench_scan_burst.py --faculty 1000 --threads 16
+    python benchmarks/bench_scan_burst.py --mode wsgi --write-behind
+    python benchmarks/bench_scan_burst.py --update-baseline
+
+Reports throughput, p50/p99 latency, non-success responses and SQLite
+"database is locked" errors, and compares burst duration and p99 latency
+with benchmarks/scan_burst_baseline.json. Exits with status 1 when a timing
+is more than --tolerance times its baseline and at least --min-delta-ms
+slower, or when any scan in a burst is not marked.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, time as dt_time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scan_burst_baseline.json')
+SCAN_TIME_IST = dt_time(9, 35)
+
+
+def configure_environment(tmp, write_behind):
+    """Point the app at a throwaway database before it is created"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'burst.db')}"
+    os.environ['SCHEDULER_ENABLED'] = '0'
+    os.environ['QR_ROTATING'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['ATTENDANCE_WRITE_BEHIND'] = '1' if write_behind else '0'
+    os.environ['ATTENDANCE_JOURNAL_DIR'] = os.path.join(tmp, 'journal')
+    # No policy file: the default window, open every day
+    os.environ['ATTENDANCE_POLICY_FILE'] = os.path.join(tmp, 'attendance_policy.json')
+
+
+def freeze_clock(policy_module):
+    """Make the attendance policy see 9:35 AM IST today"""
+    today = policy_module.ist_today()
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            if tz is None:
+                return datetime.now()
+            return tz.localize(datetime.combine(today, SCAN_TIME_IST))
+
+    policy_module.datetime = FrozenDatetime
+
+
+def seed(app, db, faculty_count):
+    from werkzeug.security import generate_password_hash
+    from models import User, QRCode
+    from qr_service import invalidate_today_qr_cache
+    from attendance_policy import ist_today
+
+    # One hash shared by every account: hashing is deliberately slow
+    password_hash = generate_password_hash('bench')
+    with app.app_context():
+        db.session.execute(db.insert(User), [
+            {
+                'username': f'burst{i}',
+                'email': f'burst{i}@example.edu',
+                'password_hash': password_hash,
+                'role': 'faculty',
+                'full_name': f'Burst Faculty {i}',
+                'department': f'Dept {i % 12}',
+            }
+            for i in range(faculty_count)
+        ])
+        qr = QRCode(code='burst-bench-code', date=ist_today(), is_active=True)
+        db.session.add(qr)
+        db.session.commit()
+        users = db.session.query(User.id, User.username, User.full_name, User.department, User.email).filter(
+            User.role == 'faculty').all()
+    invalidate_today_qr_cache()
+    return users, 'burst-bench-code'
+
+
+def login_cookies(app, users):
+    """Session cookies for every user, without paying for a password check each"""
+    cookies = []
+    for user in users:
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            # The same details login stores (see routes.remember_user)
+            sess['user_id'] = user.id
+            sess['username'] = user.username
+            sess['role'] = 'faculty'
+            sess['full_name'] = user.full_name
+            sess['department'] = user.department
+            sess['email'] = user.email
+        cookies.append(client.get_cookie('session').value)
+    return cookies
+
+
+def reset(app, db):
+    """Delete every scan so the next phase starts from an empty day"""
+    from models import Attendance
+    from live_stats import live_stats
+    from write_behind import write_behind_queue
+    if write_behind_queue is not None:
+        write_behind_queue.flush()
+    with app.app_context():
+        Attendance.query.delete()
+        db.session.commit()
+    if write_behind_queue is not None:
+        # Otherwise the queue still answers "already marked" for everyone
+        write_behind_queue.forget_seen()
+    live_stats.invalidate()
+
+
+class LockErrorCounter:
+    """Counts SQLite 'database is locked' errors seen by the engine"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'handle_error', self._on_error)
+
+    def _on_error(self, context):
+        if 'locked' in str(context.original_exception).lower():
+            with self._lock:
+                self.count += 1
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_burst(cookies, threads, send):
+    """Send one scan per cookie from `threads` workers. Returns (elapsed, latencies, outcomes)."""
+    chunks = [cookies[i::threads] for i in range(threads)]
+    latencies = []
+    outcomes = {}
+    lock = threading.Lock()
+
+    def worker(chunk):
+        local_latencies = []
+        local_outcomes = {}
+        for cookie in chunk:
+            started = time.perf_counter()
+            try:
+                outcome = send(cookie)
+            except Exception as e:
+                outcome = f'exception: {type(e).__name__}'
+            local_latencies.append(time.perf_counter() - started)
+            local_outcomes[outcome] = local_outcomes.get(outcome, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for outcome, count in local_outcomes.items():
+                outcomes[outcome] = outcomes.get(outcome, 0) + count
+
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - started, sorted(latencies), outcomes
+
+
+def classify(status, body):
+    if status != 200:
+        return f'HTTP {status}'
+    payload = json.loads(body)
+    return 'marked' if payload.get('success') else payload.get('message', 'rejected')
+
+
+def test_client_sender(app, code):
+    body = json.dumps({'code': code})
+
+    def send(cookie):
+        client = app.test_client()
+        client.set_cookie('session', cookie)
+        response = client.post('/api/verify_qr', data=body, content_type='application/json')
+        return classify(response.status_code, response.get_data())
+    return send
+
+
+def wsgi_sender(port, code):
+    body = json.dumps({'code': code})
+
+    def send(cookie):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        try:
+            conn.request('POST', '/api/verify_qr', body=body, headers={
+                'Content-Type': 'application/json',
+                'Cookie': f'session={cookie}',
+            })
+            response = conn.getresponse()
+            return classify(response.status, response.read())
+        finally:
+            conn.close()
+    return send
+
+
+def report(label, elapsed, latencies, outcomes, lock_errors):
+    total = len(latencies)
+    print(f"{label}: {total / elapsed:8.0f} scans/sec ({elapsed:.2f}s), "
+          f"p50 {percentile(latencies, 0.50) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+          f"lock errors {lock_errors}")
+    for outcome, count in sorted(outcomes.items()):
+        print(f"    {outcome}: {count}")
+
+
+def timings(label, args, elapsed, latencies):
+    """Baseline keys for one phase; they include the burst shape, so only like runs are compared"""
+    prefix = f"{label}_{args.faculty}x{args.threads}_{'write_behind' if args.write_behind else 'direct'}"
+    return {
+        f"{prefix}_elapsed": round(elapsed, 6),
+        f"{prefix}_p99": round(percentile(latencies, 0.99), 6),
+    }
+
+
+def compare(results, args):
+    """Print each timing against the baseline. Returns the keys that regressed."""
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline recorded; run with --update-baseline")
+        return []
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)['seconds']
+
+    regressions = []
+    for key, seconds in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            print(f"{key:>40}: no baseline")
+            continue
+        ratio = seconds / expected if expected else 1.0
+        slower_ms = (seconds - expected) * 1000
+        marker = '  REGRESSION' if ratio > args.tolerance and slower_ms > args.min_delta_ms else ''
+        print(f"{key:>40}: {ratio:5.2f}x baseline{marker}")
+        if marker:
+            regressions.append(key)
+    return regressions
+
+
+def update_baseline(results):
+    """Merge results into the baseline file, keeping other burst shapes"""
+    baseline = {'seconds': {}}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    baseline['machine'] = f"{platform.python_implementation()} {platform.python_version()} on {platform.machine()}"
+    baseline['recorded'] = date.today().isoformat()
+    baseline['seconds'].update(results)
+    with open(BASELINE_PATH, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f"Baseline written to {BASELINE_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--faculty', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--mode', choices=['client', 'wsgi', 'both'], default='both')
+    parser.add_argument('--write-behind', action='store_true',
+                        help='acknowledge scans before they are written (ATTENDANCE_WRITE_BEHIND=1)')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='fail when a timing exceeds baseline x tolerance')
+    parser.add_argument('--min-delta-ms', type=float, default=25.0,
+                        help='ignore slowdowns smaller than this, which are mostly noise')
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = {}
+    unmarked = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(tmp, args.write_behind)
+
+        from app import create_app, init_db, start_background_workers, db
+        import attendance_policy
+        from werkzeug.serving import make_server
+        import logging
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+        # Workers start once the tables exist, as they would after init-db
+        app = create_app(start_workers=False)
+        freeze_clock(attendance_policy)
+        with app.app_context():
+            init_db()
+            lock_errors = LockErrorCounter(db.engine)
+        start_background_workers(app)
+
+        users, code = seed(app, db, args.faculty)
+        cookies = login_cookies(app, users)
+        print(f"{len(cookies)} faculty, {args.threads} threads, "
+              f"write-behind {'on' if args.write_behind else 'off'}")
+
+        if args.mode in ('client', 'both'):
+            lock_errors.count = 0
+            elapsed, latencies, outcomes = run_burst(cookies, args.threads, test_client_sender(app, code))
+            report("test client", elapsed, latencies, outcomes, lock_errors.count)
+            results.update(timings('client', args, elapsed, latencies))
+            if outcomes.get('marked', 0) != len(cookies):
+                unmarked.append('test client')
+            reset(app, db)
+
+        if args.mode in ('wsgi', 'both'):
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+            server_thread.start()
+            try:
+                lock_errors.count = 0
+                elapsed, latencies, outcomes = run_burst(cookies, args.threads,
+                                                         wsgi_sender(server.server_port, code))
+                report("wsgi server", elapsed, latencies, outcomes, lock_errors.count)
+                results.update(timings('wsgi', args, elapsed, latencies))
+                if outcomes.get('marked', 0) != len(cookies):
+                    unmarked.append('wsgi server')
+            finally:
+                server.shutdown()
+
+        from write_behind import write_behind_queue
+        if write_behind_queue is not None:
+            write_behind_queue.stop()
+
+    if unmarked:
+        # Timings of a burst that was mostly rejected mean nothing
+        print(f"Not every scan was marked in: {', '.join(unmarked)}")
+        return 1
+
+    if args.update_baseline:
+        update_baseline(results)
+        return 0
+
+    regressions = compare(results, args)
+    if regressions:
+        print(f"{len(regressions)} timing(s) regressed beyond {args.tolerance}x: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Compare attendance scan throughput: per-request commit vs write-behind.
+
+Runs against a throwaway SQLite database, never the application database.
+
+    python benchmarks/bench_write_behind.py --faculty 1000 --threads 16
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from app import db
+from database import get_engine_options, configure_engine
+from models import User, QRCode, Attendance
+from attendance_service import mark_attendance
+from write_behind import WriteBehindQueue
+
+
+def make_bench_app(db_path):
+    bench_app = Flask("bench_write_behind")
+    url = f"sqlite:///{db_path}"
+    bench_app.config["SQLALCHEMY_DATABASE_URI"] = url
+    bench_app.config["SQLALCHEMY_ENGINE_OPTIONS"] = get_engine_options(url)
+    db.init_app(bench_app)
+    with bench_app.app_context():
+        configure_engine(db.engine)
+    return bench_app
+
+
+def seed(bench_app, faculty_count):
+    with bench_app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            {
+                'username': f'bench{i}',
+                'email': f'bench{i}@example.edu',
+                'password_hash': 'x',
+                'role': 'faculty',
+            }
+            for i in range(faculty_count)
+        ])
+        qr = QRCode(code='bench-code', date=date.today(), is_active=True)
+        db.session.add(qr)
+        db.session.commit()
+        user_ids = [user_id for (user_id,) in db.session.query(User.id).all()]
+        return user_ids, qr.id
+
+
+def reset(bench_app):
+    with bench_app.app_context():
+        Attendance.query.delete()
+        db.session.commit()
+
+
+def run_threads(bench_app, user_ids, threads, scan):
+    chunks = [user_ids[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        for user_id in chunk:
+            with bench_app.app_context():
+                scan(user_id)
+
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--faculty', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_app = make_bench_app(os.path.join(tmp, 'bench.db'))
+        user_ids, qr_id = seed(bench_app, args.faculty)
+        today = date.today()
+
+        elapsed = run_threads(bench_app, user_ids, args.threads,
+                              lambda user_id: mark_attendance(user_id, qr_id, today))
+        print(f"per-request commit: {len(user_ids) / elapsed:8.0f} scans/sec ({elapsed:.2f}s)")
+
+        reset(bench_app)
+        queue = WriteBehindQueue(journal_dir=os.path.join(tmp, 'journal'))
+        queue.start(bench_app)
+        elapsed = run_threads(bench_app, user_ids, args.threads,
+                              lambda user_id: queue.submit(user_id, qr_id, today))
+        started = time.perf_counter()
+        queue.stop()
+        drain = time.perf_counter() - started
+        with bench_app.app_context():
+            stored = Attendance.query.count()
+        print(f"write-behind:       {len(user_ids) / elapsed:8.0f} scans/sec ({elapsed:.2f}s), "
+              f"final flush {drain * 1000:.0f} ms, {stored} rows stored")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Check write-behind crash recovery against a throwaway SQLite database.
+
+Writes journal segments as a crashed worker would leave them (a dead pid, a
+stale lock file, one row already committed and a torn final line), then
+checks that replay_orphaned_journals inserts every acknowledged scan exactly
+once, deletes the segments and lock, and inserts nothing on a second run.
+
+    python benchmarks/check_journal_replay.py
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import date, datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import db
+from models import Attendance
+from attendance_service import insert_attendance_rows
+from write_behind import WriteBehindQueue
+from bench_write_behind import make_bench_app, seed
+
+
+def dead_pid():
+    """The pid of a process that has already exited"""
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def write_orphaned_journal(journal_dir, pid, rows):
+    """Segments and lock file as left behind by a worker killed mid-flush"""
+    os.makedirs(journal_dir, exist_ok=True)
+    with open(os.path.join(journal_dir, f"worker-{pid}.lock"), 'w'):
+        pass
+    half = len(rows) // 2
+    for seq, segment in enumerate((rows[:half], rows[half:]), 1):
+        with open(os.path.join(journal_dir, f"journal-{pid}-{seq:06d}.jsonl"), 'w', encoding='utf-8') as f:
+            for row in segment:
+                f.write(json.dumps(dict(row, date=row['date'].isoformat(),
+                                        scan_time=row['scan_time'].isoformat())) + '\n')
+            if seq == 2:
+                # Killed while writing: this scan was never acknowledged
+                f.write('{"user_id": ')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--faculty', type=int, default=50)
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(ok, message):
+        print(f"{'ok  ' if ok else 'FAIL'} {message}")
+        if not ok:
+            failures.append(message)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_app = make_bench_app(os.path.join(tmp, 'replay.db'))
+        user_ids, qr_id = seed(bench_app, args.faculty)
+        today = date.today()
+        scan_time = datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = [
+            {'user_id': user_id, 'qr_code_id': qr_id, 'date': today, 'scan_time': scan_time, 'status': 'present'}
+            for user_id in user_ids
+        ]
+
+        journal_dir = os.path.join(tmp, 'journal')
+        write_orphaned_journal(journal_dir, dead_pid(), rows)
+
+        with bench_app.app_context():
+            # The first row was flushed before the crash, but its segment survived
+            insert_attendance_rows(rows[:1])
+            db.session.commit()
+
+            queue = WriteBehindQueue(journal_dir=journal_dir)
+            replayed = queue.replay_orphaned_journals()
+            stored = Attendance.query.count()
+            check(replayed == len(rows) - 1, f"first replay inserted {replayed} of {len(rows) - 1} missing rows")
+            check(stored == len(rows), f"{stored} attendance rows stored for {len(rows)} journaled scans")
+            check(not os.listdir(journal_dir), f"journal directory emptied (left: {os.listdir(journal_dir)})")
+
+            replayed = queue.replay_orphaned_journals()
+            check(replayed == 0, f"second replay inserted {replayed} rows")
+            check(Attendance.query.count() == stored, "row count unchanged by the second replay")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
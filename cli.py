@@ -0,0 +1,42 @@
+"""
+Command line tools, run with `flask --app main <command>`.
+"""
+import click
+
+def register_commands(app):
+    """Attach the CLI commands to the Flask app"""
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create missing tables and columns and the default admin user."""
+        from app import init_db
+        init_db()
+        click.echo("Database initialized")
+
+    @app.cli.command('generate-qr')
+    @click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+                  help='First day (YYYY-MM-DD)')
+    @click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+                  help='Last day (YYYY-MM-DD)')
+    def generate_qr_command(start, end):
+        """Create QR codes for every day in a date range that has none."""
+        from qr_service import generate_qr_codes
+        try:
+            created = generate_qr_codes(start.date(), end.date())
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Generated {created} QR codes for {start.date()} to {end.date()}")
+
+    @app.cli.command('import-faculty')
+    @click.argument('roster', type=click.Path(exists=True, dir_okay=False))
+    def import_faculty_command(roster):
+        """Register faculty from a CSV or XLSX roster file."""
+        from faculty_import import read_roster, import_faculty
+        try:
+            with open(roster, 'rb') as f:
+                result = import_faculty(read_roster(f, roster))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for error in result.errors:
+            click.echo(f"Row {error.row} ({error.username or '-'}): {error.message}", err=True)
+        click.echo(f"Imported {result.created} of {result.total} faculty")
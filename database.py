@@ -0,0 +1,122 @@
+"""
+Database engine configuration.
+
+DATABASE_URL picks the database (SQLite by default). SQLite connections get
+WAL journaling and tuned pragmas so scans (writers) and dashboards/reports
+(readers) stop blocking each other; server databases get a sized connection
+pool instead.
+"""
+import os
+from sqlalchemy import event, inspect, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+import logging
+
+DEFAULT_DATABASE_URL = "sqlite:///attendance_system.db"
+
+# SQLite tuning
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Connection pool sizing for PostgreSQL/MySQL
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+
+# Dialects that support INSERT ... ON CONFLICT DO NOTHING
+UPSERT_INSERTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': pg_insert,
+}
+
+def get_database_url():
+    """Database URL from DATABASE_URL, falling back to the local SQLite file"""
+    url = os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL
+
+    # Heroku/Replit style URLs use a scheme SQLAlchemy no longer accepts
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == "sqlite"
+
+def get_engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS suited to the database behind url"""
+    if is_sqlite(url):
+        # Local file: nothing to ping or recycle. Let sqlite3 wait on locks
+        # too, in case a connection is used before the pragmas run.
+        return {
+            "connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000.0},
+        }
+
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply per-connection SQLite pragmas"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        # Negative cache_size is in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+def configure_engine(engine):
+    """Install connect-time hooks for the given engine"""
+    if engine.dialect.name == "sqlite":
+        if engine.url.database in (None, "", ":memory:"):
+            # WAL and mmap do not apply to in-memory databases
+            return
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+        logging.info("SQLite configured with WAL journal mode")
+
+def upgrade_schema(engine, metadata):
+    """Bring an existing database up to date with the models.
+
+    create_all() only creates missing tables, so this adds nullable columns
+    and indexes that were introduced after the database was first created.
+    A unique index that cannot be built is fatal: code relies on it for
+    ON CONFLICT inserts, so serving without it would fail every insert.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in metadata.sorted_tables:
+        if table.name in existing_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns or not column.nullable:
+                    continue
+                quote = engine.dialect.identifier_preparer.quote
+                column_type = column.type.compile(dialect=engine.dialect)
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(text(
+                            f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}'
+                        ))
+                    logging.info(f"Added column {table.name}.{column.name}")
+                except Exception as e:
+                    logging.error(f"Failed to add column {table.name}.{column.name}: {e}")
+
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except Exception as e:
+                if index.unique:
+                    raise RuntimeError(f"Cannot create unique index {index.name}; "
+                                       f"remove the duplicate rows first: {e}") from e
+                logging.error(f"Failed to create index {index.name}: {e}")
@@ -1,411 +1,227 @@
-import smtplib
+import atexit
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from datetime import date, datetime
-import pytz
+from datetime import date
 from app import db
 import os
-import tempfile
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-
-# Indian Standard Time
-IST = pytz.timezone('Asia/Kolkata')
+from mail_transport import SMTPTransport
+import calendar
+from sqlalchemy import and_, func
+from report_render import (ReportRow, ReportDataset, format_scan_time,
+                           RangeReportRow, RangeReportDataset, format_scan_datetime,
+                           generate_range_excel_report, generate_range_pdf_report,
+                           render_reports)
 from models import User, Attendance, EmailLog
+from attendance_policy import attendance_policy, ist_today, ist_date
 import logging
-import os
 
 # Email configuration
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "1").lower() in ("1", "true", "yes")
 SMTP_EMAIL = os.getenv("SMTP_EMAIL", "marcus189076@gmail.com")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "ggeg knjd qtku ssrb")
 
+# Shared connection reused by every send
+mail_transport = SMTPTransport(SMTP_SERVER, SMTP_PORT, SMTP_EMAIL, SMTP_PASSWORD, use_tls=SMTP_USE_TLS)
+atexit.register(mail_transport.close)
+
 ADMIN_EMAILS = [
     "nlramcharanplacement@gmail.com",
     "2224m1a3133@vemu.org"
 ]
 
-def generate_excel_report(present_faculty, absent_faculty, today_attendances, today):
-    """Generate Excel report for attendance"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Attendance Report"
-    
-    # Title
-    ws['A1'] = f"Daily Attendance Report - {today.strftime('%B %d, %Y')}"
-    ws['A1'].font = Font(size=16, bold=True)
-    ws['A1'].alignment = Alignment(horizontal='center')
-    ws.merge_cells('A1:E1')
-    
-    # Headers
-    headers = ['S.No', 'Faculty Name', 'Username', 'Department', 'Status', 'Scan Time']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col, value=header)
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        cell.alignment = Alignment(horizontal='center')
-    
-    # Data
-    row = 4
-    
-    # Present faculty
-    for i, faculty in enumerate(present_faculty, 1):
-        attendance = next((att for att, user in today_attendances if user.id == faculty.id), None)
-        if attendance:
-            ist_time = attendance.scan_time.replace(tzinfo=pytz.UTC).astimezone(IST)
-            scan_time = ist_time.strftime('%I:%M %p IST')
+def build_report_dataset(report_date):
+    """Build the daily report rows with a single faculty LEFT OUTER JOIN attendance query"""
+    rows = db.session.query(
+        User.full_name, User.username, User.department, Attendance.scan_time
+    ).outerjoin(
+        Attendance, and_(Attendance.user_id == User.id, Attendance.date == report_date)
+    ).filter(
+        User.role == 'faculty'
+    ).order_by(Attendance.scan_time, User.username).all()
+
+    present = []
+    absent = []
+    for full_name, username, department, scan_time in rows:
+        name = full_name or username
+        department = department or 'N/A'
+        if scan_time is not None:
+            present.append(ReportRow(name, username, department, 'Present', format_scan_time(scan_time)))
         else:
-            scan_time = 'N/A'
-            
-        ws.cell(row=row, column=1, value=i)
-        ws.cell(row=row, column=2, value=faculty.full_name or faculty.username)
-        ws.cell(row=row, column=3, value=faculty.username)
-        ws.cell(row=row, column=4, value=faculty.department or 'N/A')
-        ws.cell(row=row, column=5, value='Present')
-        ws.cell(row=row, column=6, value=scan_time)
-        
-        # Green background for present
-        for col in range(1, 7):
-            ws.cell(row=row, column=col).fill = PatternFill(start_color="E6FFE6", end_color="E6FFE6", fill_type="solid")
-        
-        row += 1
-    
-    # Absent faculty
-    for i, faculty in enumerate(absent_faculty, len(present_faculty) + 1):
-        ws.cell(row=row, column=1, value=i)
-        ws.cell(row=row, column=2, value=faculty.full_name or faculty.username)
-        ws.cell(row=row, column=3, value=faculty.username)
-        ws.cell(row=row, column=4, value=faculty.department or 'N/A')
-        ws.cell(row=row, column=5, value='Absent')
-        ws.cell(row=row, column=6, value='N/A')
-        
-        # Red background for absent
-        for col in range(1, 7):
-            ws.cell(row=row, column=col).fill = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
-        
-        row += 1
-    
-    # Summary
-    row += 2
-    ws.cell(row=row, column=1, value='Summary').font = Font(bold=True)
-    row += 1
-    ws.cell(row=row, column=1, value=f'Total Faculty: {len(present_faculty) + len(absent_faculty)}')
-    row += 1
-    ws.cell(row=row, column=1, value=f'Present: {len(present_faculty)}')
-    row += 1
-    ws.cell(row=row, column=1, value=f'Absent: {len(absent_faculty)}')
-    row += 1
-    attendance_rate = (len(present_faculty) / (len(present_faculty) + len(absent_faculty)) * 100) if (len(present_faculty) + len(absent_faculty)) > 0 else 0
-    ws.cell(row=row, column=1, value=f'Attendance Rate: {attendance_rate:.1f}%')
-    
-    # Auto-adjust column widths
-    column_letters = ['A', 'B', 'C', 'D', 'E', 'F']
-    column_widths = [8, 25, 15, 20, 12, 20]  # Default widths for each column
-    
-    for i, width in enumerate(column_widths):
-        if i < len(column_letters):
-            ws.column_dimensions[column_letters[i]].width = width
-    
-    # Save to temporary file
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-    wb.save(temp_file.name)
-    return temp_file.name
+            absent.append(ReportRow(name, username, department, 'Absent', 'N/A'))
 
-def generate_pdf_report(present_faculty, absent_faculty, today_attendances, today):
-    """Generate PDF report for attendance"""
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-    doc = SimpleDocTemplate(temp_file.name, pagesize=A4)
-    story = []
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        alignment=1,  # Center
-        spaceAfter=30
-    )
-    
-    # Title
-    title = Paragraph(f"Daily Attendance Report - {today.strftime('%B %d, %Y')}", title_style)
-    story.append(title)
-    
-    # Present Faculty Table
-    if present_faculty:
-        story.append(Paragraph("Present Faculty", styles['Heading2']))
-        present_data = [['S.No', 'Faculty Name', 'Username', 'Department', 'Scan Time']]
-        
-        for i, faculty in enumerate(present_faculty, 1):
-            attendance = next((att for att, user in today_attendances if user.id == faculty.id), None)
-            if attendance:
-                ist_time = attendance.scan_time.replace(tzinfo=pytz.UTC).astimezone(IST)
-                scan_time = ist_time.strftime('%I:%M %p IST')
-            else:
-                scan_time = 'N/A'
-                
-            present_data.append([
-                str(i),
-                faculty.full_name or faculty.username,
-                faculty.username,
-                faculty.department or 'N/A',
-                scan_time
-            ])
-        
-        present_table = Table(present_data)
-        present_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.lightgreen),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        story.append(present_table)
-        story.append(Spacer(1, 20))
-    
-    # Absent Faculty Table
-    if absent_faculty:
-        story.append(Paragraph("Absent Faculty", styles['Heading2']))
-        absent_data = [['S.No', 'Faculty Name', 'Username', 'Department']]
-        
-        for i, faculty in enumerate(absent_faculty, 1):
-            absent_data.append([
-                str(i),
-                faculty.full_name or faculty.username,
-                faculty.username,
-                faculty.department or 'N/A'
-            ])
-        
-        absent_table = Table(absent_data)
-        absent_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.lightcoral),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        story.append(absent_table)
-        story.append(Spacer(1, 20))
-    
-    # Summary
-    story.append(Paragraph("Summary", styles['Heading2']))
-    total_faculty = len(present_faculty) + len(absent_faculty)
-    attendance_rate = (len(present_faculty) / total_faculty * 100) if total_faculty > 0 else 0
-    
-    summary_data = [
-        ['Total Faculty', str(total_faculty)],
-        ['Present', str(len(present_faculty))],
-        ['Absent', str(len(absent_faculty))],
-        ['Attendance Rate', f'{attendance_rate:.1f}%']
+    return ReportDataset(report_date, present, absent)
+
+def month_date_range(year, month):
+    """First and last day of a month"""
+    start_date = date(year, month, 1)
+    end_date = date(year, month, calendar.monthrange(year, month)[1])
+    return start_date, end_date
+
+def build_range_dataset(start_date, end_date):
+    """Per-faculty present/absent counts and first/last scan over a date range.
+
+    All totals come from one GROUP BY aggregate over faculty LEFT OUTER JOIN
+    attendance, so the cost does not grow with a per-day Python loop.
+    Faculty registered during the range are only counted from the day they
+    registered.
+    """
+    # Working days (no weekends or holidays) that have happened so far count towards absences
+    last_counted = min(end_date, ist_today())
+    working_days = attendance_policy.working_days(start_date, last_counted)
+    working_days_from = {start_date: working_days}
+
+    rows = db.session.query(
+        User.full_name,
+        User.username,
+        User.department,
+        User.created_at,
+        func.count(Attendance.id),
+        func.min(Attendance.scan_time),
+        func.max(Attendance.scan_time)
+    ).outerjoin(
+        Attendance, and_(
+            Attendance.user_id == User.id,
+            Attendance.date >= start_date,
+            Attendance.date <= end_date
+        )
+    ).filter(
+        User.role == 'faculty'
+    ).group_by(
+        User.id, User.full_name, User.username, User.department, User.created_at
+    ).order_by(User.username).all()
+
+    report_rows = []
+    for full_name, username, department, created_at, present_days, first_scan, last_scan in rows:
+        counted_from = max(start_date, ist_date(created_at)) if created_at else start_date
+        if counted_from not in working_days_from:
+            working_days_from[counted_from] = attendance_policy.working_days(counted_from, last_counted)
+        row_working_days = working_days_from[counted_from]
+
+        report_rows.append(RangeReportRow(
+            name=full_name or username,
+            username=username,
+            department=department or 'N/A',
+            present_days=present_days,
+            absent_days=max(row_working_days - present_days, 0),
+            working_days=row_working_days,
+            attendance_rate=(min(present_days, row_working_days) / row_working_days * 100) if row_working_days > 0 else 0,
+            first_scan=format_scan_datetime(first_scan),
+            last_scan=format_scan_datetime(last_scan)
+        ))
+
+    return RangeReportDataset(start_date, end_date, working_days, report_rows)
+
+def build_attendance_email(report_date):
+    """Subject, HTML body and attachments for a day's attendance report"""
+    # One query for every faculty member and their attendance that day
+    dataset = build_report_dataset(report_date)
+
+    # The HTML body, Excel and PDF reports are rendered concurrently in the
+    # report process pool
+    subject = f"Daily Attendance Report - {report_date.strftime('%B %d, %Y')}"
+    reports = render_reports(dataset)
+
+    attachments = [
+        {
+            'filename': f'attendance_report_{report_date.strftime("%Y%m%d")}.xlsx',
+            'content': reports['xlsx']
+        },
+        {
+            'filename': f'attendance_report_{report_date.strftime("%Y%m%d")}.pdf',
+            'content': reports['pdf']
+        }
     ]
-    
-    summary_table = Table(summary_data)
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.lightblue),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(summary_table)
-    
-    # Build PDF
-    doc.build(story)
-    return temp_file.name
+    return subject, reports['html'], attachments
+
+def build_monthly_email(year, month):
+    """Subject, HTML body and attachments for a month's attendance summary"""
+    start_date, end_date = month_date_range(year, month)
+    dataset = build_range_dataset(start_date, end_date)
 
-def send_attendance_email():
-    """Send attendance report email to administrators"""
-    try:
-        # Get today's date
-        today = date.today()
-        
-        # Get all faculty members
-        all_faculty = User.query.filter_by(role='faculty').all()
-        
-        # Get today's attendances
-        today_attendances = db.session.query(Attendance, User).join(User).filter(
-            Attendance.date == today
-        ).all()
-        
-        # Create lists of present and absent faculty
-        present_faculty = [user for att, user in today_attendances]
-        present_faculty_ids = [f.id for f in present_faculty]
-        absent_faculty = [f for f in all_faculty if f.id not in present_faculty_ids]
-        
-        # Create email content
-        subject = f"Daily Attendance Report - {today.strftime('%B %d, %Y')}"
-        
-        html_body = f"""
+    subject = f"Monthly Attendance Report - {start_date.strftime('%B %Y')}"
+    reports = render_reports(dataset, {
+        'xlsx': generate_range_excel_report,
+        'pdf': generate_range_pdf_report,
+    })
+
+    html_body = f"""
         <html>
         <body>
-            <h2>Daily Attendance Report</h2>
-            <p><strong>Date:</strong> {today.strftime('%B %d, %Y')}</p>
-            
-            <h3>Present Faculty ({len(present_faculty)})</h3>
-            <ul>
-        """
-        
-        for faculty in present_faculty:
-            attendance = next((att for att, user in today_attendances if user.id == faculty.id), None)
-            if attendance:
-                # Convert to IST for display
-                ist_time = attendance.scan_time.replace(tzinfo=pytz.UTC).astimezone(IST)
-                scan_time = ist_time.strftime('%I:%M %p IST')
-            else:
-                scan_time = 'N/A'
-            html_body += f"<li>{faculty.full_name} ({faculty.username}) - {faculty.department} - Scanned at: {scan_time}</li>"
-        
-        html_body += """
-            </ul>
-            
-            <h3>Absent Faculty ({})
-            <ul>
-        """.format(len(absent_faculty))
-        
-        for faculty in absent_faculty:
-            html_body += f"<li>{faculty.full_name} ({faculty.username}) - {faculty.department}</li>"
-        
-        html_body += """
-            </ul>
-            
-            <p><strong>Total Faculty:</strong> {}</p>
-            <p><strong>Present:</strong> {}</p>
-            <p><strong>Absent:</strong> {}</p>
-            <p><strong>Attendance Rate:</strong> {:.1f}%</p>
-            
+            <h2>Monthly Attendance Report</h2>
+            <p><strong>Month:</strong> {start_date.strftime('%B %Y')}</p>
+            <p><strong>Working Days:</strong> {dataset.working_days}</p>
+            <p><strong>Total Faculty:</strong> {len(dataset.rows)}</p>
+            <p><strong>Overall Attendance Rate:</strong> {dataset.overall_rate:.1f}%</p>
+            <p>Per-faculty totals are attached as Excel and PDF.</p>
+
             <hr>
             <p><em>This is an automated email from the Smart Attendance System.</em></p>
         </body>
         </html>
-        """.format(
-            len(all_faculty),
-            len(present_faculty),
-            len(absent_faculty),
-            (len(present_faculty) / len(all_faculty) * 100) if all_faculty else 0
-        )
-        
-        # Generate Excel and PDF reports
-        excel_file = generate_excel_report(present_faculty, absent_faculty, today_attendances, today)
-        pdf_file = generate_pdf_report(present_faculty, absent_faculty, today_attendances, today)
-        
-        # Prepare attachments
-        attachments = [
-            {
-                'filename': f'attendance_report_{today.strftime("%Y%m%d")}.xlsx',
-                'filepath': excel_file
-            },
-            {
-                'filename': f'attendance_report_{today.strftime("%Y%m%d")}.pdf',
-                'filepath': pdf_file
-            }
-        ]
-        
-        # Send email with attachments
-        success = send_email_with_attachments(ADMIN_EMAILS, subject, html_body, attachments)
-        
-        # Clean up temporary files
-        try:
-            os.unlink(excel_file)
-            os.unlink(pdf_file)
-        except:
-            pass
-        
-        # Log email
-        email_log = EmailLog(
-            date=today,
-            recipients=', '.join(ADMIN_EMAILS),
-            subject=subject,
-            status='sent' if success else 'failed'
-        )
-        db.session.add(email_log)
-        db.session.commit()
-        
-        return success
-        
-    except Exception as e:
-        logging.error(f"Error sending attendance email: {e}")
-        return False
+        """
+
+    attachments = [
+        {
+            'filename': f'attendance_report_{start_date.strftime("%Y%m")}.xlsx',
+            'content': reports['xlsx']
+        },
+        {
+            'filename': f'attendance_report_{start_date.strftime("%Y%m")}.pdf',
+            'content': reports['pdf']
+        }
+    ]
+    return subject, html_body, attachments
 
-def send_email(recipients, subject, html_body):
-    """Send email using SMTP"""
-    try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = SMTP_EMAIL
-        msg['To'] = ', '.join(recipients)
-        
-        # Add HTML content
-        html_part = MIMEText(html_body, 'html')
-        msg.attach(html_part)
-        
-        # Send email
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_EMAIL, SMTP_PASSWORD)
-        
-        for recipient in recipients:
-            server.sendmail(SMTP_EMAIL, recipient, msg.as_string())
-        
-        server.quit()
-        logging.info(f"Email sent successfully to {recipients}")
-        return True
-        
-    except Exception as e:
-        logging.error(f"Failed to send email: {e}")
-        return False
+def log_email(report_date, recipients, subject, success, attempts=1, latency_ms=None):
+    """Record a delivery outcome in EmailLog"""
+    email_log = EmailLog(
+        date=report_date,
+        recipients=', '.join(recipients),
+        subject=subject,
+        status='sent' if success else 'failed',
+        attempts=attempts,
+        latency_ms=latency_ms
+    )
+    db.session.add(email_log)
+    db.session.commit()
+
+def build_message(recipients, subject, html_body, attachments=None):
+    """Build a MIME message with an HTML body and optional attachments"""
+    msg = MIMEMultipart() if attachments else MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = SMTP_EMAIL
+    msg['To'] = ', '.join(recipients)
 
-def send_email_with_attachments(recipients, subject, html_body, attachments):
-    """Send email with attachments using SMTP"""
-    try:
-        # Create message
-        msg = MIMEMultipart()
-        msg['Subject'] = subject
-        msg['From'] = SMTP_EMAIL
-        msg['To'] = ', '.join(recipients)
-        
-        # Add HTML content
-        html_part = MIMEText(html_body, 'html')
-        msg.attach(html_part)
-        
-        # Add attachments
-        for attachment in attachments:
+    # Add HTML content
+    msg.attach(MIMEText(html_body, 'html'))
+
+    # Attachments carry either in-memory 'content' bytes or a 'filepath'
+    for attachment in attachments or []:
+        content = attachment.get('content')
+        if content is None:
             with open(attachment['filepath'], 'rb') as file:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(file.read())
-                encoders.encode_base64(part)
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename= {attachment["filename"]}'
-                )
-                msg.attach(part)
-        
-        # Send email
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_EMAIL, SMTP_PASSWORD)
-        
-        for recipient in recipients:
-            server.sendmail(SMTP_EMAIL, recipient, msg.as_string())
-        
-        server.quit()
-        logging.info(f"Email with attachments sent successfully to {recipients}")
-        return True
-        
-    except Exception as e:
-        logging.error(f"Failed to send email with attachments: {e}")
-        return False
+                content = file.read()
+
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(content)
+        encoders.encode_base64(part)
+        part.add_header(
+            'Content-Disposition',
+            f'attachment; filename= {attachment["filename"]}'
+        )
+        msg.attach(part)
+
+    return msg
+
+def deliver_email(recipients, subject, html_body, attachments=None):
+    """Send an email over the shared connection, raising on failure"""
+    msg = build_message(recipients, subject, html_body, attachments)
+
+    # One envelope for all recipients
+    refused = mail_transport.send(msg, recipients, sender=SMTP_EMAIL)
+    if refused:
+        logging.warning(f"Recipients refused: {refused}")
@@ -0,0 +1,326 @@
+"""
+Bulk faculty registration from a CSV or XLSX roster.
+
+The roster needs username, email and password columns; full_name and
+department are optional. Header names are matched case-insensitively, with
+spaces treated as underscores ("Full Name" works).
+
+Rows are validated first, then checked against existing accounts with one
+query. Passwords are hashed in a process pool, since hashing is deliberately
+slow and threads would serialize on the GIL. Accounts are written with
+chunked multi-row inserts. Rows that cannot be imported are reported by row
+number and do not stop the rest.
+
+Imports started from the admin page run on a background thread (see
+start_import) and record their outcome in the faculty_import table, so the
+upload request returns at once and any worker can show the result. The
+running job refreshes a heartbeat; a job whose process died or whose
+heartbeat stopped is marked failed when its status is next looked at.
+"""
+import csv
+import io
+import json
+import os
+import socket
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import User, FacultyImport
+from passwords import hash_password
+from report_render import process_pool_context
+import logging
+
+# Password hashing processes. FACULTY_IMPORT_WORKERS=0 hashes in the calling thread.
+FACULTY_IMPORT_WORKERS = int(os.getenv("FACULTY_IMPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+FACULTY_IMPORT_CHUNK_SIZE = int(os.getenv("FACULTY_IMPORT_CHUNK_SIZE", "500"))
+# Also keeps the conflict query within the database's bind parameter limit
+FACULTY_IMPORT_MAX_ROWS = int(os.getenv("FACULTY_IMPORT_MAX_ROWS", "5000"))
+# How often a running import refreshes its heartbeat, and how long a silent one is trusted
+FACULTY_IMPORT_HEARTBEAT_SECONDS = int(os.getenv("FACULTY_IMPORT_HEARTBEAT_SECONDS", "15"))
+FACULTY_IMPORT_STALE_SECONDS = int(os.getenv("FACULTY_IMPORT_STALE_SECONDS", "120"))
+
+REQUIRED_COLUMNS = ('username', 'email', 'password')
+MIN_PASSWORD_LENGTH = 6
+
+# A roster line that passed validation
+RosterEntry = namedtuple('RosterEntry', ['row', 'username', 'email', 'password', 'full_name', 'department'])
+# A roster line that was not imported; row is the line number in the file
+RowError = namedtuple('RowError', ['row', 'username', 'message'])
+
+class ImportResult(namedtuple('ImportResult', ['created', 'errors'])):
+    """Number of accounts created and the rows that were rejected"""
+    __slots__ = ()
+
+    @property
+    def total(self):
+        return self.created + len(self.errors)
+
+def _column_name(header):
+    return str(header or '').strip().lower().replace(' ', '_')
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    # Spreadsheets turn numeric passwords and usernames into floats
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def _csv_records(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    for record in csv.reader(text):
+        yield record
+
+def _xlsx_records(stream):
+    from openpyxl import load_workbook
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for record in wb.active.iter_rows(values_only=True):
+            yield record
+    finally:
+        wb.close()
+
+def read_roster(stream, filename):
+    """Yield (row number, {column: text}) for each non-blank line of a CSV or XLSX roster.
+
+    Raises ValueError if the file type is not supported or a required
+    column is missing.
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        records = _csv_records(stream)
+    elif extension == '.xlsx':
+        records = _xlsx_records(stream)
+    else:
+        raise ValueError("Roster must be a .csv or .xlsx file")
+
+    header = next(records, None)
+    if header is None:
+        raise ValueError("Roster is empty")
+    columns = [_column_name(h) for h in header]
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"Roster is missing column(s): {', '.join(missing)}")
+
+    for row_number, record in enumerate(records, 2):
+        values = dict(zip(columns, (_cell_text(value) for value in record)))
+        if any(values.values()):
+            yield row_number, values
+
+def _validate(records, errors):
+    """RosterEntries for well-formed rows; problems are appended to errors"""
+    entries = []
+    first_row_for = {}
+    count = 0
+    for row_number, values in records:
+        count += 1
+        if count > FACULTY_IMPORT_MAX_ROWS:
+            raise ValueError(f"Roster has more than {FACULTY_IMPORT_MAX_ROWS} rows; split it into smaller files")
+
+        username = values.get('username', '')
+        email = values.get('email', '')
+        password = values.get('password', '')
+        missing = [column for column in REQUIRED_COLUMNS if not values.get(column)]
+        if missing:
+            errors.append(RowError(row_number, username, f"Missing {', '.join(missing)}"))
+            continue
+        if '@' not in email:
+            errors.append(RowError(row_number, username, f"Invalid email address {email}"))
+            continue
+        if len(password) < MIN_PASSWORD_LENGTH:
+            errors.append(RowError(row_number, username,
+                                   f"Password must be at least {MIN_PASSWORD_LENGTH} characters"))
+            continue
+
+        duplicate = first_row_for.get(('username', username)) or first_row_for.get(('email', email))
+        if duplicate:
+            errors.append(RowError(row_number, username, f"Duplicate of row {duplicate}"))
+            continue
+        first_row_for[('username', username)] = row_number
+        first_row_for[('email', email)] = row_number
+
+        entries.append(RosterEntry(row_number, username, email, password,
+                                   values.get('full_name') or None, values.get('department') or None))
+    return entries
+
+def _without_existing(entries, errors):
+    """Drop entries whose username or email is already registered, in one query"""
+    if not entries:
+        return entries
+    existing = db.session.query(User.username, User.email).filter(db.or_(
+        User.username.in_([entry.username for entry in entries]),
+        User.email.in_([entry.email for entry in entries]),
+    )).all()
+    taken_usernames = {row.username for row in existing}
+    taken_emails = {row.email for row in existing}
+
+    remaining = []
+    for entry in entries:
+        if entry.username in taken_usernames:
+            errors.append(RowError(entry.row, entry.username, "Username already exists"))
+        elif entry.email in taken_emails:
+            errors.append(RowError(entry.row, entry.username, f"Email {entry.email} already exists"))
+        else:
+            remaining.append(entry)
+    return remaining
+
+def hash_passwords(passwords, workers=FACULTY_IMPORT_WORKERS):
+    """hash_password for every password, spread over worker processes"""
+    if workers <= 0 or len(passwords) < 2:
+        return [hash_password(password) for password in passwords]
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=process_pool_context()) as executor:
+            chunksize = max(1, len(passwords) // (workers * 4))
+            return list(executor.map(hash_password, passwords, chunksize=chunksize))
+    except BrokenProcessPool as e:
+        logging.error(f"Password hashing pool failed, hashing inline: {e}")
+        return [hash_password(password) for password in passwords]
+
+def _insert_one_by_one(chunk, errors):
+    """Fallback when a chunk hits a unique constraint: find the offending rows"""
+    created = 0
+    for entry, values in chunk:
+        try:
+            db.session.execute(db.insert(User), [values])
+            db.session.commit()
+            created += 1
+        except IntegrityError:
+            db.session.rollback()
+            errors.append(RowError(entry.row, entry.username, "Username or email already exists"))
+    return created
+
+def import_faculty(records, workers=FACULTY_IMPORT_WORKERS, chunk_size=FACULTY_IMPORT_CHUNK_SIZE):
+    """Register faculty from (row number, values) pairs such as read_roster yields.
+
+    Needs an app context. Returns an ImportResult; raises ValueError if the
+    roster itself is unusable.
+    """
+    errors = []
+    entries = _validate(records, errors)
+    entries = _without_existing(entries, errors)
+
+    hashes = hash_passwords([entry.password for entry in entries], workers)
+    rows = [
+        (entry, {
+            'username': entry.username,
+            'email': entry.email,
+            'password_hash': password_hash,
+            'role': 'faculty',
+            'full_name': entry.full_name,
+            'department': entry.department,
+        })
+        for entry, password_hash in zip(entries, hashes)
+    ]
+
+    created = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            db.session.execute(db.insert(User), [values for _, values in chunk])
+            db.session.commit()
+            created += len(chunk)
+        except IntegrityError:
+            # An account was registered elsewhere since the conflict check
+            db.session.rollback()
+            created += _insert_one_by_one(chunk, errors)
+
+    if created:
+        from live_stats import live_stats
+        live_stats.invalidate()
+
+    errors.sort(key=lambda error: error.row)
+    logging.info(f"Faculty import: {created} created, {len(errors)} rejected")
+    return ImportResult(created, errors)
+
+def start_import(app, records, filename):
+    """Run import_faculty on a background thread. Returns the FacultyImport row tracking it.
+
+    records must already be read into a list, since the upload is gone once
+    the request ends.
+    """
+    if len(records) > FACULTY_IMPORT_MAX_ROWS:
+        raise ValueError(f"Roster has more than {FACULTY_IMPORT_MAX_ROWS} rows; split it into smaller files")
+
+    job = FacultyImport(filename=filename, status='running', rows=len(records),
+                        owner=_owner_id(), heartbeat_at=_utcnow())
+    db.session.add(job)
+    db.session.commit()
+
+    threading.Thread(target=_run_import, args=(app, job.id, records),
+                     name=f"faculty-import-{job.id}", daemon=True).start()
+    return job
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _owner_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _heartbeat(app, job_id, stop):
+    """Refresh the job's heartbeat until stop is set"""
+    while not stop.wait(FACULTY_IMPORT_HEARTBEAT_SECONDS):
+        with app.app_context():
+            try:
+                db.session.query(FacultyImport).filter_by(id=job_id, status='running').update(
+                    {'heartbeat_at': _utcnow()})
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Faculty import {job_id} heartbeat failed: {e}")
+
+def _run_import(app, job_id, records):
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(app, job_id, stop),
+                     name=f"faculty-import-{job_id}-heartbeat", daemon=True).start()
+    try:
+        with app.app_context():
+            try:
+                result = import_faculty(records)
+                status, created = 'done', result.created
+                errors = [list(error) for error in result.errors]
+            except Exception as e:
+                logging.error(f"Faculty import {job_id} failed: {e}")
+                db.session.rollback()
+                status, created, errors = 'failed', 0, [[None, '', str(e)]]
+
+            job = db.session.get(FacultyImport, job_id)
+            job.status = status
+            job.created = created
+            job.errors = json.dumps(errors)
+            job.finished_at = _utcnow()
+            db.session.commit()
+    finally:
+        stop.set()
+
+def _is_stale(job):
+    """True if the process running job is gone or has stopped reporting"""
+    host, _, pid = (job.owner or '').rpartition(':')
+    if host == socket.gethostname() and pid.isdigit():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass
+    last_seen = job.heartbeat_at or job.started_at
+    return last_seen is None or (_utcnow() - last_seen).total_seconds() > FACULTY_IMPORT_STALE_SECONDS
+
+def import_result(job):
+    """The ImportResult of a finished FacultyImport, or None while it is running.
+
+    A running job whose process has died is marked failed first.
+    """
+    if job.status == 'running':
+        if not _is_stale(job):
+            return None
+        logging.warning(f"Faculty import {job.id} stopped without finishing; marking it failed")
+        job.status = 'failed'
+        job.errors = json.dumps([[None, '', 'The import stopped before finishing; upload the roster again']])
+        job.finished_at = _utcnow()
+        db.session.commit()
+    errors = [RowError(*error) for error in json.loads(job.errors or '[]')]
+    return ImportResult(job.created, errors)
@@ -0,0 +1,132 @@
+"""
+Server-Sent Events fan-out for the admin dashboard.
+
+Each connected dashboard gets a bounded queue. Publishing serializes an
+event once and drops it into every queue, so the cost of a scan does not
+grow with a database query per subscriber. A subscriber that stops reading
+and lets its queue fill up is disconnected; the browser's EventSource then
+reconnects and starts again from a fresh snapshot.
+
+Events only reach dashboards connected to the worker that handled the scan.
+The periodic 'stats' event carries the live_stats counters, which are
+resynced from the database, so counts from other workers still show up.
+
+A stream occupies whatever serves the request for minutes at a time. On a
+server that handles one request per worker (gunicorn's default sync worker)
+that would starve scans, so there the dashboard reloads itself every
+LIVE_RELOAD_SECONDS instead of streaming.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from live_stats import live_stats
+import logging
+
+SSE_HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Streams are closed after this long (the browser reconnects) so they never
+# pin a worker indefinitely
+SSE_MAX_STREAM_SECONDS = int(os.getenv("SSE_MAX_STREAM_SECONDS", "300"))
+SSE_QUEUE_SIZE = 100
+# auto: stream only if the server runs requests on threads (wsgi.multithread);
+# 1: always (e.g. gevent or eventlet workers); 0: never
+SSE_STREAMING = os.getenv("SSE_STREAMING", "auto").lower()
+LIVE_RELOAD_SECONDS = 30
+
+def streaming_supported(environ):
+    """Whether a long-lived stream would leave the server free for other requests"""
+    if SSE_STREAMING in ('1', 'true', 'yes'):
+        return True
+    if SSE_STREAMING in ('0', 'false', 'no'):
+        return False
+    return bool(environ.get('wsgi.multithread'))
+
+def format_sse(event, data):
+    """Encode one SSE message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def stats_payload(stats):
+    return {
+        'total_faculty': stats['total_faculty'],
+        'present': stats['present'],
+        'attendance_rate': stats['attendance_rate'],
+    }
+
+def scan_payload(scan):
+    return {
+        'name': scan.name,
+        'username': scan.username,
+        'department': scan.department,
+        'scan_time': scan.scan_time.strftime('%I:%M %p') if scan.scan_time else '-',
+    }
+
+class Broadcaster:
+    """Fan-out of pre-encoded SSE messages to subscriber queues"""
+
+    def __init__(self, queue_size=SSE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def is_subscribed(self, subscriber):
+        with self._lock:
+            return subscriber in self._subscribers
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        """Send an event to every subscriber"""
+        message = format_sse(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Too slow to keep up; cut it off rather than block the scan
+                self.unsubscribe(subscriber)
+                logging.info("Dropped a slow live dashboard subscriber")
+
+    def stream(self):
+        """Generator for one subscriber: a snapshot, then events and periodic stats"""
+        subscriber = self.subscribe()
+        started = time.monotonic()
+        try:
+            stats = live_stats.snapshot()
+            yield format_sse('snapshot', dict(stats_payload(stats),
+                                              recent_scans=[scan_payload(s) for s in stats['recent_scans']]))
+
+            while (time.monotonic() - started < SSE_MAX_STREAM_SECONDS and
+                   self.is_subscribed(subscriber)):
+                try:
+                    yield subscriber.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    # Also serves as a keep-alive that reveals closed connections
+                    yield format_sse('stats', stats_payload(live_stats.snapshot()))
+        finally:
+            self.unsubscribe(subscriber)
+
+def publish_scan(scan):
+    """Announce a new attendance mark with the updated counters"""
+    if scan is None or not broadcaster.subscriber_count():
+        return
+    payload = scan_payload(scan)
+    # counters() never reseeds, so publishing adds no SQL to the scan path
+    payload['stats'] = stats_payload(live_stats.counters())
+    broadcaster.publish('scan', payload)
+
+broadcaster = Broadcaster()
@@ -0,0 +1,174 @@
+"""
+In-process live attendance statistics for the admin dashboard.
+
+The counters are seeded from the database once per IST day and updated in
+memory by every successful scan, so rendering the dashboard needs no SQL.
+
+Each worker process keeps its own copy and only sees the scans it handled
+itself, so snapshot() also re-seeds the copy every LIVE_STATS_RESYNC_SECONDS
+to pick up scans and registrations made by other workers. Seeding queries run
+outside the counters' lock, so record_scan() never waits on the database.
+"""
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+from app import db
+from models import User, Attendance
+from attendance_policy import IST, ist_today, utc_to_ist
+import logging
+
+LIVE_STATS_RECENT = int(os.getenv("LIVE_STATS_RECENT", "10"))
+LIVE_STATS_RESYNC_SECONDS = int(os.getenv("LIVE_STATS_RESYNC_SECONDS", "30"))
+
+FacultyInfo = namedtuple('FacultyInfo', ['name', 'username', 'department'])
+ScanEvent = namedtuple('ScanEvent', ['user_id', 'name', 'username', 'department', 'scan_time'])
+
+class LiveStats:
+    """Today's attendance counters, recent scans and the faculty directory"""
+
+    def __init__(self, recent_size=LIVE_STATS_RECENT, resync_seconds=LIVE_STATS_RESYNC_SECONDS):
+        self.resync_seconds = resync_seconds
+        self.app = None
+        self._lock = threading.Lock()
+        # Held while a reseed queries the database; never taken by record_scan
+        self._seed_lock = threading.Lock()
+        self._day = None
+        self._seeded_at = 0.0
+        # Scans recorded while a reseed is querying, merged into its result
+        self._scans_during_seed = None
+        self._faculty = {}
+        self._present = set()
+        self._recent = deque(maxlen=recent_size)
+
+    def init_app(self, app):
+        """Remember the app, so reseeds can run outside a request"""
+        self.app = app
+
+    def _seed(self, day):
+        """Reload everything for day from the database (caller holds _seed_lock)"""
+        with self._lock:
+            self._scans_during_seed = []
+
+        # Own app context, so background threads can trigger a reseed too
+        try:
+            with self.app.app_context():
+                faculty = {
+                    row.id: FacultyInfo(row.full_name or row.username, row.username, row.department or 'N/A')
+                    for row in db.session.query(User.id, User.full_name, User.username, User.department)
+                    .filter(User.role == 'faculty')
+                }
+                scans = db.session.query(Attendance.user_id, Attendance.scan_time).filter(
+                    Attendance.date == day
+                ).order_by(Attendance.scan_time.desc()).all()
+        except Exception:
+            with self._lock:
+                self._scans_during_seed = None
+            raise
+
+        with self._lock:
+            recorded = [event for event in self._scans_during_seed if self._day == day]
+            self._scans_during_seed = None
+
+            self._faculty = faculty
+            self._present = {scan.user_id for scan in scans}
+            self._recent.clear()
+            # The ring buffer holds the newest scans, oldest first
+            for scan in reversed(scans[:self._recent.maxlen]):
+                self._recent.append(self._event(scan.user_id, utc_to_ist(scan.scan_time)))
+            for event in recorded:
+                if event.user_id not in self._present:
+                    self._present.add(event.user_id)
+                    self._recent.append(event)
+
+            self._day = day
+            self._seeded_at = time.monotonic()
+            logging.debug(f"Live stats seeded for {day}: {len(self._present)}/{len(self._faculty)} present")
+
+    def _event(self, user_id, scan_time):
+        info = self._faculty.get(user_id) or FacultyInfo(f'User {user_id}', '', 'N/A')
+        return ScanEvent(user_id, info.name, info.username, info.department, scan_time)
+
+    def _is_stale(self, today):
+        return self._day != today or time.monotonic() - self._seeded_at >= self.resync_seconds
+
+    def _refresh(self):
+        """Reseed on the first use of the day and after the resync interval"""
+        today = ist_today()
+        with self._lock:
+            if not self._is_stale(today):
+                return
+            has_today = self._day == today
+
+        # One reseed at a time; while it runs, others keep serving today's counters
+        if not self._seed_lock.acquire(blocking=not has_today):
+            return
+        try:
+            with self._lock:
+                if not self._is_stale(today):
+                    return
+            self._seed(today)
+        finally:
+            self._seed_lock.release()
+
+    def record_scan(self, user_id, scan_time=None):
+        """Count a successful scan. Returns the ScanEvent, or None if already counted.
+
+        Only touches memory; reseeding is left to snapshot().
+        """
+        scan_time = scan_time or datetime.now(IST)
+        today = ist_today()
+        with self._lock:
+            if self._day != today:
+                # First scan of a new day: start from zero, the next snapshot reseeds
+                self._day = today
+                self._seeded_at = 0.0
+                self._present = set()
+                self._recent.clear()
+            if user_id in self._present:
+                return None
+            self._present.add(user_id)
+            event = self._event(user_id, scan_time)
+            self._recent.append(event)
+            if self._scans_during_seed is not None:
+                self._scans_during_seed.append(event)
+            return event
+
+    def add_faculty(self, user):
+        """Add a newly registered faculty member to the directory"""
+        with self._lock:
+            if self._day is not None:
+                self._faculty[user.id] = FacultyInfo(user.full_name or user.username, user.username,
+                                                     user.department or 'N/A')
+
+    def _counters(self):
+        """Counters as a dict (caller holds _lock)"""
+        total = len(self._faculty)
+        present = len(self._present)
+        return {
+            'date': self._day,
+            'total_faculty': total,
+            'present': present,
+            'attendance_rate': round(present / total * 100, 1) if total else 0.0,
+        }
+
+    def counters(self):
+        """Current counters without reseeding, cheap enough for the scan path"""
+        with self._lock:
+            return self._counters()
+
+    def snapshot(self):
+        """Current counters and recent scans (newest first)"""
+        self._refresh()
+        with self._lock:
+            stats = self._counters()
+            stats['recent_scans'] = list(reversed(self._recent))
+            return stats
+
+    def invalidate(self):
+        """Force a reseed on the next access"""
+        with self._lock:
+            self._day = None
+
+live_stats = LiveStats()
@@ -0,0 +1,181 @@
+"""
+Persistent outbound email queue.
+
+Emails are stored in the outbound_email table and delivered by a background
+worker thread. Failed deliveries are retried with exponential backoff until
+max_attempts is reached, after which the row is dead-lettered (status
+'dead'). Every final outcome is recorded in EmailLog with the attempt count
+and latency.
+
+Several processes can run the worker at once: a row is claimed with a
+conditional UPDATE before it is sent, so each attempt happens exactly once.
+"""
+import os
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from app import db
+from models import OutboundEmail
+from attendance_policy import ist_today
+import logging
+
+MAIL_QUEUE_POLL_SECONDS = int(os.getenv("MAIL_QUEUE_POLL_SECONDS", "15"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "6"))
+MAIL_BACKOFF_BASE_SECONDS = int(os.getenv("MAIL_BACKOFF_BASE_SECONDS", "30"))
+MAIL_BACKOFF_MAX_SECONDS = int(os.getenv("MAIL_BACKOFF_MAX_SECONDS", "3600"))
+# A claimed row whose worker died is retried after this long
+MAIL_SEND_LEASE_SECONDS = int(os.getenv("MAIL_SEND_LEASE_SECONDS", "600"))
+
+_wakeup = threading.Event()
+_worker_thread = None
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _enqueue(kind, recipients, subject=None, report_date=None):
+    outbound = OutboundEmail(
+        kind=kind,
+        report_date=report_date,
+        recipients=', '.join(recipients),
+        subject=subject,
+        status='pending',
+        max_attempts=MAIL_MAX_ATTEMPTS,
+        next_attempt_at=_utcnow()
+    )
+    db.session.add(outbound)
+    db.session.commit()
+
+    # Deliver promptly if this process runs a worker
+    _wakeup.set()
+    return outbound
+
+def enqueue_attendance_report(report_date=None, recipients=None):
+    """Queue the attendance report for a day (today by default)"""
+    from email_service import ADMIN_EMAILS
+    report_date = report_date or ist_today()
+    return _enqueue('attendance_report', recipients or ADMIN_EMAILS,
+                    subject=f"Daily Attendance Report - {report_date.strftime('%B %d, %Y')}",
+                    report_date=report_date)
+
+def enqueue_monthly_report(year, month, recipients=None):
+    """Queue the attendance summary for a month"""
+    from email_service import ADMIN_EMAILS
+    month_start = date(year, month, 1)
+    return _enqueue('monthly_report', recipients or ADMIN_EMAILS,
+                    subject=f"Monthly Attendance Report - {month_start.strftime('%B %Y')}",
+                    report_date=month_start)
+
+def backoff_delay(attempts):
+    """Seconds to wait before the next attempt after `attempts` failures"""
+    delay = min(MAIL_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), MAIL_BACKOFF_MAX_SECONDS)
+    # Jitter so several failed emails do not retry in lockstep
+    return delay * random.uniform(0.9, 1.1)
+
+def _claim(outbound_id, now):
+    """Atomically take a due row. Returns False if another worker got it first."""
+    result = db.session.execute(
+        db.update(OutboundEmail)
+        .where(
+            OutboundEmail.id == outbound_id,
+            OutboundEmail.status.in_(('pending', 'sending')),
+            OutboundEmail.next_attempt_at <= now
+        )
+        .values(
+            status='sending',
+            attempts=OutboundEmail.attempts + 1,
+            next_attempt_at=now + timedelta(seconds=MAIL_SEND_LEASE_SECONDS)
+        )
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+def _deliver(outbound):
+    """Render (if needed) and send one queued email. Returns the subject and recipients."""
+    from email_service import build_attendance_email, build_monthly_email, deliver_email
+
+    recipients = [r.strip() for r in outbound.recipients.split(',') if r.strip()]
+    if outbound.kind == 'attendance_report':
+        subject, html_body, attachments = build_attendance_email(outbound.report_date)
+    elif outbound.kind == 'monthly_report':
+        subject, html_body, attachments = build_monthly_email(outbound.report_date.year,
+                                                              outbound.report_date.month)
+    else:
+        raise ValueError(f"Unknown email kind: {outbound.kind}")
+
+    deliver_email(recipients, subject, html_body, attachments)
+    return subject, recipients
+
+def process_due_emails(limit=10):
+    """Deliver up to `limit` due emails. Returns the number sent."""
+    from email_service import log_email
+
+    now = _utcnow()
+    due_ids = [row_id for (row_id,) in db.session.query(OutboundEmail.id).filter(
+        OutboundEmail.status.in_(('pending', 'sending')),
+        OutboundEmail.next_attempt_at <= now
+    ).order_by(OutboundEmail.next_attempt_at).limit(limit).all()]
+
+    sent = 0
+    for outbound_id in due_ids:
+        if not _claim(outbound_id, _utcnow()):
+            continue
+
+        outbound = db.session.get(OutboundEmail, outbound_id)
+        started = time.monotonic()
+        try:
+            subject, recipients = _deliver(outbound)
+        except Exception as e:
+            db.session.rollback()
+            latency_ms = int((time.monotonic() - started) * 1000)
+            outbound.last_error = str(e)[:2000]
+
+            if outbound.attempts >= outbound.max_attempts:
+                outbound.status = 'dead'
+                db.session.commit()
+                logging.error(f"Email {outbound.id} dead-lettered after {outbound.attempts} attempts: {e}")
+                log_email(outbound.report_date or ist_today(), outbound.recipients.split(', '),
+                          outbound.subject or outbound.kind, False,
+                          attempts=outbound.attempts, latency_ms=latency_ms)
+            else:
+                delay = backoff_delay(outbound.attempts)
+                outbound.status = 'pending'
+                outbound.next_attempt_at = _utcnow() + timedelta(seconds=delay)
+                db.session.commit()
+                logging.warning(f"Email {outbound.id} attempt {outbound.attempts} failed, "
+                                f"retrying in {delay:.0f}s: {e}")
+            continue
+
+        latency_ms = int((time.monotonic() - started) * 1000)
+        outbound.status = 'sent'
+        outbound.subject = subject
+        outbound.sent_at = _utcnow()
+        outbound.last_error = None
+        db.session.commit()
+        log_email(outbound.report_date or ist_today(), recipients, subject, True,
+                  attempts=outbound.attempts, latency_ms=latency_ms)
+        logging.info(f"Email {outbound.id} sent after {outbound.attempts} attempt(s) in {latency_ms} ms")
+        sent += 1
+
+    return sent
+
+def _run_worker(app):
+    while True:
+        _wakeup.wait(MAIL_QUEUE_POLL_SECONDS)
+        _wakeup.clear()
+        try:
+            with app.app_context():
+                while process_due_emails():
+                    pass
+        except Exception as e:
+            logging.error(f"Mail queue worker error: {e}")
+
+def start_mail_worker(app):
+    """Start the background thread that drains the queue"""
+    global _worker_thread
+    if _worker_thread is not None:
+        return
+    _worker_thread = threading.Thread(target=_run_worker, args=(app,), name="mail-queue", daemon=True)
+    _worker_thread.start()
+    _wakeup.set()
+    logging.info("Mail queue worker started")
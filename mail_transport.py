@@ -0,0 +1,91 @@
+"""
+Persistent SMTP transport.
+
+Keeps one authenticated SMTP connection open and reuses it across sends,
+reconnecting when the server has dropped it. Each message is serialized once
+and delivered to all recipients in a single envelope.
+
+For local testing point it at a debugging server, e.g.
+    python -m aiosmtpd -n -l localhost:1025
+with SMTP_SERVER=localhost SMTP_PORT=1025 SMTP_USE_TLS=0.
+"""
+import smtplib
+import threading
+import logging
+
+# Errors that mean the connection is unusable and worth one reconnect
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class SMTPTransport:
+    """Thread-safe SMTP sender that reuses its connection"""
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+        self._server = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.use_tls:
+                server.starttls()
+                server.ehlo()
+            # Debugging servers do not offer AUTH, so only log in when it is available
+            if self.username and self.password and server.has_extn('auth'):
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+
+        self._server = server
+        logging.debug(f"Connected to SMTP server {self.host}:{self.port}")
+
+    def _disconnect(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+        self._server = None
+
+    def send(self, msg, recipients, sender=None):
+        """Send a message to all recipients in one SMTP transaction.
+
+        Returns the dict of refused recipients (empty when all were accepted),
+        as smtplib.SMTP.sendmail does.
+        """
+        sender = sender or msg['From'] or self.username
+        data = msg.as_bytes()  # serialize once for every recipient
+
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._server is None:
+                        self._connect()
+                    return self._server.sendmail(sender, list(recipients), data)
+                except RECONNECT_ERRORS as e:
+                    # Idle connections get dropped by the server; retry once on a fresh one
+                    self._disconnect()
+                    if attempt:
+                        raise
+                    logging.info(f"SMTP connection lost ({e}), reconnecting")
+                except smtplib.SMTPException:
+                    # Reset the session so the next message starts from a clean state
+                    self._disconnect()
+                    raise
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
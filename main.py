@@ -1,4 +1,10 @@
-from app import app
+from app import create_app, init_db
+
+# Report and import pool workers re-import this module as __mp_main__;
+# they must not start a second set of background workers
+app = create_app(start_workers=False if __name__ == '__mp_main__' else None)
 
 if __name__ == '__main__':
+    with app.app_context():
+        init_db()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,185 @@
+"""
+Request and SQL instrumentation.
+
+Flask before/after-request hooks time every request, and SQLAlchemy cursor
+events count the queries it runs and the time spent in them. The results are
+kept per endpoint and rendered in the Prometheus text format by /metrics.
+
+Metrics are per process: with several gunicorn workers each one reports its
+own numbers, labelled with its pid.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from flask import request
+from sqlalchemy import event
+import logging
+
+# Latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Queries-per-request histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Requests slower than this are logged with their query count
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class MetricsRegistry:
+    """Per-endpoint request metrics plus process-wide SQL totals"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = defaultdict(int)  # (endpoint, method, status) -> count
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.sql_seconds = defaultdict(float)
+        self.sql_queries_total = 0
+        self.sql_seconds_total = 0.0
+
+    def record_request(self, endpoint, method, status, seconds, query_count, sql_seconds):
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            self.latency[endpoint].observe(seconds)
+            self.queries[endpoint].observe(query_count)
+            self.sql_seconds[endpoint] += sql_seconds
+
+    def record_query(self, seconds):
+        with self._lock:
+            self.sql_queries_total += 1
+            self.sql_seconds_total += seconds
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        pid = os.getpid()
+        lines = []
+
+        def labels(**values):
+            values['pid'] = pid
+            return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in values.items()) + '}'
+
+        def histogram(name, help_text, histograms):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for endpoint, hist in sorted(histograms.items()):
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f"{name}_bucket{labels(endpoint=endpoint, le=bound)} {count}")
+                lines.append(f"{name}_bucket{labels(endpoint=endpoint, le='+Inf')} {hist.count}")
+                lines.append(f"{name}_sum{labels(endpoint=endpoint)} {hist.sum:.6f}")
+                lines.append(f"{name}_count{labels(endpoint=endpoint)} {hist.count}")
+
+        with self._lock:
+            lines.append("# HELP http_requests_total Requests handled, by endpoint, method and status")
+            lines.append("# TYPE http_requests_total counter")
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+            histogram("http_request_duration_seconds", "Request latency until the response is returned",
+                      self.latency)
+            histogram("http_request_sql_queries", "SQL statements executed per request", self.queries)
+
+            lines.append("# HELP http_request_sql_seconds_total Time spent in SQL while handling requests")
+            lines.append("# TYPE http_request_sql_seconds_total counter")
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f"http_request_sql_seconds_total{labels(endpoint=endpoint)} {seconds:.6f}")
+
+            lines.append("# HELP sql_queries_total SQL statements executed, including background work")
+            lines.append("# TYPE sql_queries_total counter")
+            lines.append(f"sql_queries_total{labels()} {self.sql_queries_total}")
+            lines.append("# HELP sql_seconds_total Time spent in SQL, including background work")
+            lines.append("# TYPE sql_seconds_total counter")
+            lines.append(f"sql_seconds_total{labels()} {self.sql_seconds_total:.6f}")
+
+        lines.append("# HELP process_start_time_seconds Start time of the process since the epoch")
+        lines.append("# TYPE process_start_time_seconds gauge")
+        lines.append(f"process_start_time_seconds{labels()} {self.started_at:.3f}")
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+registry = MetricsRegistry()
+
+class RequestStats:
+    """Counters for the request being handled"""
+
+    __slots__ = ('started', 'queries', 'sql_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+# A context variable rather than flask.g, so queries run inside a nested
+# app context (e.g. live_stats reseeding) still count towards the request
+_request_stats = ContextVar('request_stats', default=None)
+
+# Hooks
+
+def _before_request():
+    _request_stats.set(RequestStats())
+
+def _after_request(response):
+    stats = _request_stats.get()
+    if stats is None:
+        return response
+    _request_stats.set(None)
+
+    seconds = time.perf_counter() - stats.started
+    query_count = stats.queries
+    sql_seconds = stats.sql_seconds
+    # Unmatched URLs share one label so scanners cannot blow up the series count
+    endpoint = request.endpoint or 'unmatched'
+    registry.record_request(endpoint, request.method, response.status_code, seconds,
+                            query_count, sql_seconds)
+
+    if seconds * 1000 >= SLOW_REQUEST_MS:
+        logging.warning(f"Slow request {request.method} {request.path}: {seconds * 1000:.0f} ms, "
+                        f"{query_count} queries, {sql_seconds * 1000:.0f} ms in SQL")
+    return response
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    registry.record_query(seconds)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += seconds
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    starts = exception_context.connection.info.get('metrics_query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def init_metrics(app, engine):
+    """Install the request hooks on app and the SQL timing hooks on engine"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
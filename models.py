@@ -17,6 +17,10 @@ class User(db.Model):
 
 class QRCode(db.Model):
     __tablename__ = 'qr_code'
+    __table_args__ = (
+        # One code per day; bulk generation relies on it to skip existing days
+        db.Index('uq_qr_code_date', 'date', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(255), unique=True, nullable=False)
@@ -28,11 +32,18 @@ class QRCode(db.Model):
         return f'<QRCode {self.code} for {self.date}>'
 
 class Attendance(db.Model):
+    __table_args__ = (
+        # One attendance row per faculty member per day; also serves the
+        # (user_id, date) lookups done on every scan. A unique index rather
+        # than a table constraint so it can be added to existing databases.
+        db.Index('uq_attendance_user_date', 'user_id', 'date', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     qr_code_id = db.Column(db.Integer, db.ForeignKey('qr_code.id'), nullable=False)
     scan_time = db.Column(db.DateTime, default=func.now())
-    date = db.Column(db.Date, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
     status = db.Column(db.String(20), default='present')  # 'present' or 'absent'
     
     # Relationships
@@ -49,6 +60,72 @@ class EmailLog(db.Model):
     subject = db.Column(db.String(255), nullable=False)
     sent_at = db.Column(db.DateTime, default=func.now())
     status = db.Column(db.String(20), default='sent')  # 'sent' or 'failed'
+    attempts = db.Column(db.Integer, nullable=True)
+    latency_ms = db.Column(db.Integer, nullable=True)  # time spent rendering and sending
     
     def __repr__(self):
         return f'<EmailLog {self.subject} on {self.date}>'
+
+class OutboundEmail(db.Model):
+    """Queued email, drained by the background mail worker (see mail_queue)"""
+    __tablename__ = 'outbound_email'
+    __table_args__ = (
+        db.Index('ix_outbound_email_due', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # 'attendance_report' or 'monthly_report'
+    report_date = db.Column(db.Date, nullable=True)
+    recipients = db.Column(db.Text, nullable=False)
+    subject = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'sending', 'sent' or 'dead'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=6)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=func.now())
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=func.now())
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<OutboundEmail {self.kind} {self.status}>'
+
+class JobRun(db.Model):
+    """Last completed occurrence of each scheduled job (see scheduler)"""
+    __tablename__ = 'job_run'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    last_run_at = db.Column(db.DateTime, nullable=False)  # scheduled time of the run, UTC
+    updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f'<JobRun {self.name} at {self.last_run_at}>'
+
+class SchedulerLease(db.Model):
+    """Leader lease: only the process holding an unexpired lease runs scheduled jobs"""
+    __tablename__ = 'scheduler_lease'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(128), nullable=False)  # host:pid:nonce of the leader
+    expires_at = db.Column(db.DateTime, nullable=False)  # UTC
+    acquired_at = db.Column(db.DateTime, nullable=False)  # UTC
+    
+    def __repr__(self):
+        return f'<SchedulerLease {self.name} held by {self.holder}>'
+
+class FacultyImport(db.Model):
+    """A roster import started from the admin page, run in the background (see faculty_import)"""
+    __tablename__ = 'faculty_import'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='running')  # 'running', 'done' or 'failed'
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text, nullable=True)  # JSON list of [row, username, message]
+    started_at = db.Column(db.DateTime, default=func.now())
+    finished_at = db.Column(db.DateTime, nullable=True)
+    owner = db.Column(db.String(255), nullable=True)  # 'host:pid' of the process running the import
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # Refreshed by the owner while it runs
+    
+    def __repr__(self):
+        return f'<FacultyImport {self.id} {self.status}>'
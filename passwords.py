@@ -0,0 +1,40 @@
+"""
+Password hashing policy.
+
+PASSWORD_HASH_METHOD takes any method string werkzeug understands, e.g.
+"scrypt" (the default), "scrypt:16384:8:1" or "pbkdf2:sha256:600000". The
+cost of the method is what every login pays, so it sizes the CPU needed for
+the morning login spike. Changing it is safe: existing hashes keep working,
+and each one is replaced with the new method the next time its owner logs in.
+"""
+import functools
+import os
+from werkzeug.security import generate_password_hash, check_password_hash
+
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+
+def hash_password(password):
+    """Hash a password with the configured method"""
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+@functools.lru_cache(maxsize=None)
+def _current_method():
+    # Hashes store the method with its parameters filled in ("scrypt" becomes
+    # "scrypt:32768:8:1"), so compare against what werkzeug actually writes
+    return hash_password('').split('$', 1)[0]
+
+def needs_rehash(password_hash):
+    """True if password_hash was made with a different method or cost than the configured one"""
+    return password_hash.split('$', 1)[0] != _current_method()
+
+def verify_password(user, password):
+    """Check a login password, upgrading the stored hash if the policy changed.
+
+    Returns True on a match. An upgraded hash is left in the session for the
+    caller to commit.
+    """
+    if not check_password_hash(user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+    return True
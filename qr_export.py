@@ -0,0 +1,134 @@
+"""
+Batch export of QR codes for a date range.
+
+Codes are rendered in the report process pool, a bounded window ahead of
+the writer, and written out as either a ZIP of PNGs or a printable PDF with
+one code per page. Both are produced as iterators of byte chunks so the
+route can stream them instead of holding the whole file in memory.
+"""
+import itertools
+import os
+import tempfile
+import zipfile
+from collections import deque
+from io import BytesIO
+from qr_images import render_qr_image
+from report_render import get_report_executor, REPORT_WORKERS
+from attendance_policy import attendance_policy
+import logging
+
+# Longest date range one export may cover
+QR_EXPORT_MAX_DAYS = int(os.getenv("QR_EXPORT_MAX_DAYS", "366"))
+# Codes rendered ahead of the one being written
+QR_EXPORT_WINDOW = max(2, 2 * REPORT_WORKERS)
+QR_EXPORT_IMAGE_SIZE = 600
+# PDFs up to this size stay in memory before spilling to a temporary file
+QR_EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def iter_rendered_pngs(qr_codes, size=QR_EXPORT_IMAGE_SIZE):
+    """Yield (qr_code, png_bytes) in order.
+
+    QR matrix building is pure Python, so codes are rendered in worker
+    processes rather than threads. At most QR_EXPORT_WINDOW renders are
+    outstanding, which keeps memory flat however long the range is. The
+    export bypasses the QR image cache so it does not evict today's code.
+    """
+    if REPORT_WORKERS <= 0:
+        for qr in qr_codes:
+            yield qr, render_qr_image(qr.code, 'png', size)
+        return
+
+    executor = get_report_executor()
+    remaining = iter(qr_codes)
+    pending = deque(
+        (qr, executor.submit(render_qr_image, qr.code, 'png', size))
+        for qr in itertools.islice(remaining, QR_EXPORT_WINDOW)
+    )
+    try:
+        while pending:
+            qr, future = pending.popleft()
+            png = future.result()
+            # Keep the workers busy while this one is written out
+            for next_qr in itertools.islice(remaining, 1):
+                pending.append((next_qr, executor.submit(render_qr_image, next_qr.code, 'png', size)))
+            yield qr, png
+    finally:
+        # The client went away: drop renders nobody will read
+        for _, future in pending:
+            future.cancel()
+
+class _ChunkWriter:
+    """Write-only file object that hands its contents over in chunks"""
+
+    def __init__(self):
+        self._buffer = BytesIO()
+
+    def write(self, data):
+        return self._buffer.write(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = self._buffer.getvalue()
+        self._buffer = BytesIO()
+        return data
+
+def stream_qr_zip(qr_codes):
+    """Yield a ZIP archive with one PNG per code, file by file"""
+    writer = _ChunkWriter()
+    # The writer cannot seek, so zipfile uses data descriptors instead of
+    # going back to patch the headers. PNGs are already compressed.
+    with zipfile.ZipFile(writer, 'w', zipfile.ZIP_STORED) as archive:
+        for qr, png in iter_rendered_pngs(qr_codes):
+            archive.writestr(f"qr_code_{qr.date.strftime('%Y-%m-%d')}.png", png)
+            yield writer.take()
+    yield writer.take()
+
+def stream_qr_pdf(qr_codes):
+    """Yield a printable PDF with one code per page"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    width, height = A4
+    image_size = 4.5 * inch
+
+    spool = tempfile.SpooledTemporaryFile(max_size=QR_EXPORT_SPOOL_BYTES)
+    try:
+        pdf = canvas.Canvas(spool, pagesize=A4)
+        pdf.setTitle("Daily Attendance QR Codes")
+
+        for qr, png in iter_rendered_pngs(qr_codes):
+            pdf.setFont("Helvetica-Bold", 22)
+            pdf.drawCentredString(width / 2, height - 1.2 * inch, "Daily Attendance QR Code")
+            pdf.setFont("Helvetica", 16)
+            pdf.drawCentredString(width / 2, height - 1.7 * inch, qr.date.strftime('%A, %B %d, %Y'))
+
+            top = height - 2.2 * inch
+            pdf.drawImage(ImageReader(BytesIO(png)), (width - image_size) / 2, top - image_size,
+                          width=image_size, height=image_size)
+
+            pdf.setFont("Helvetica", 11)
+            text_y = top - image_size - 0.5 * inch
+            for line in (f"Scan this QR code between {attendance_policy.describe()} IST to mark attendance.",
+                         "Each faculty member can only mark attendance once per day."):
+                pdf.drawCentredString(width / 2, text_y, line)
+                text_y -= 0.25 * inch
+            pdf.setFont("Courier", 9)
+            pdf.drawCentredString(width / 2, text_y - 0.2 * inch, f"Code: {qr.code}")
+            pdf.showPage()
+
+        pdf.save()
+        logging.info(f"Exported {len(qr_codes)} QR codes as PDF ({spool.tell()} bytes)")
+
+        spool.seek(0)
+        while True:
+            chunk = spool.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
@@ -0,0 +1,130 @@
+"""
+Rendered QR image cache.
+
+Rendering a QR code and encoding it as PNG takes a few milliseconds of CPU,
+and the same few images (today's code, printed or shown on a projector that
+refreshes) are requested over and over. Rendered images are kept in a
+process-local LRU keyed by (code, format, size), optionally backed by a
+directory shared between workers (QR_IMAGE_CACHE_DIR).
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from io import BytesIO
+import logging
+
+QR_IMAGE_CACHE_SIZE = int(os.getenv("QR_IMAGE_CACHE_SIZE", "256"))
+QR_IMAGE_CACHE_DIR = os.getenv("QR_IMAGE_CACHE_DIR") or None
+
+QR_IMAGE_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+QR_IMAGE_DEFAULT_SIZE = 330
+QR_IMAGE_MIN_SIZE = 64
+QR_IMAGE_MAX_SIZE = 2048
+
+# QR border in modules, as recommended by the spec
+QR_BORDER = 4
+
+RenderedQR = namedtuple('RenderedQR', ['data', 'mimetype', 'etag'])
+
+def render_qr_image(code, image_format='png', size=QR_IMAGE_DEFAULT_SIZE):
+    """Render a QR code as PNG or SVG bytes, about size pixels wide"""
+    import qrcode
+    import qrcode.image.svg
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, border=QR_BORDER)
+    qr.add_data(code)
+    qr.make(fit=True)
+
+    # Whole pixels per module, so the image stays sharp
+    box_size = max(1, size // (qr.modules_count + 2 * QR_BORDER))
+    qr.box_size = box_size
+
+    stream = BytesIO()
+    if image_format == 'svg':
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(stream)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(stream, 'PNG')
+    return stream.getvalue()
+
+class QRImageCache:
+    """Thread-safe LRU of rendered images with an optional on-disk tier"""
+
+    def __init__(self, max_entries=QR_IMAGE_CACHE_SIZE, disk_dir=QR_IMAGE_CACHE_DIR):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        # Hash the key so the code itself never appears in a file name
+        name = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.disk_dir, f"{name}.{key[1]}")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.warning(f"QR image cache read failed: {e}")
+            return None
+
+    def _write_disk(self, key, data):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            # Atomic, so other workers never read a half-written file
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"QR image cache write failed: {e}")
+
+    def get(self, code, image_format='png', size=QR_IMAGE_DEFAULT_SIZE):
+        """Rendered image for a code, rendering it only on a cache miss"""
+        if image_format not in QR_IMAGE_FORMATS:
+            raise ValueError(f"Unsupported QR image format: {image_format}")
+        size = min(max(int(size), QR_IMAGE_MIN_SIZE), QR_IMAGE_MAX_SIZE)
+        key = (code, image_format, size)
+
+        with self._lock:
+            rendered = self._entries.get(key)
+            if rendered is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return rendered
+            self.misses += 1
+
+        data = self._read_disk(key)
+        if data is None:
+            data = render_qr_image(code, image_format, size)
+            self._write_disk(key, data)
+
+        rendered = RenderedQR(data, QR_IMAGE_FORMATS[image_format],
+                              hashlib.sha256(data).hexdigest()[:32])
+        with self._lock:
+            self._entries[key] = rendered
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return rendered
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+qr_image_cache = QRImageCache()
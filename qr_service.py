@@ -1,20 +1,97 @@
-import qrcode
+import hashlib
+import hmac
+import os
 import secrets
 import string
-from datetime import datetime, date, timedelta
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from flask import current_app
 from app import db
+from database import UPSERT_INSERTS
 from models import QRCode
+from attendance_policy import ist_today
 import logging
 
+# Process-local cache of today's active QR row. Other workers may change the
+# row behind our back, so entries also expire after QR_CACHE_TTL seconds.
+QR_CACHE_TTL = int(os.getenv("QR_CACHE_TTL", "300"))
+
+# Bulk generation limits: longest range per call and rows per INSERT statement
+QR_MAX_RANGE_DAYS = int(os.getenv("QR_MAX_RANGE_DAYS", "1100"))
+QR_INSERT_CHUNK_SIZE = 500
+
+# Rotating mode: the projected code is an HMAC token that changes every
+# QR_ROTATION_SECONDS and is accepted for QR_TOLERANCE_STEPS earlier steps
+QR_ROTATING = os.getenv("QR_ROTATING", "0") == "1"
+QR_ROTATION_SECONDS = int(os.getenv("QR_ROTATION_SECONDS", "30"))
+QR_TOLERANCE_STEPS = int(os.getenv("QR_TOLERANCE_STEPS", "2"))
+
+CachedQR = namedtuple('CachedQR', ['id', 'code'])
+
+_today_qr_cache = {'date': None, 'qr': None, 'loaded_at': 0.0}
+_today_qr_lock = threading.Lock()
+
 def generate_qr_code_string():
     """Generate a random QR code string"""
     length = 32
     characters = string.ascii_letters + string.digits
     return ''.join(secrets.choice(characters) for _ in range(length))
 
+def generate_qr_codes(start_date, end_date):
+    """Create QR codes for every day in [start_date, end_date] that has none.
+
+    Existing days are found with one query and the missing ones inserted in
+    bulk. Returns the number of codes created; concurrent calls are safe
+    because the unique index on date turns duplicates into no-ops.
+    """
+    if start_date > end_date:
+        raise ValueError("Start date must be on or before end date")
+    if (end_date - start_date).days >= QR_MAX_RANGE_DAYS:
+        raise ValueError(f"Date range is limited to {QR_MAX_RANGE_DAYS} days")
+
+    existing_dates = {qr_date for (qr_date,) in db.session.query(QRCode.date).filter(
+        QRCode.date.between(start_date, end_date)
+    )}
+
+    rows = []
+    current_day = start_date
+    while current_day <= end_date:
+        if current_day not in existing_dates:
+            rows.append({'code': generate_qr_code_string(), 'date': current_day, 'is_active': True})
+        current_day += timedelta(days=1)
+
+    if not rows:
+        return 0
+
+    dialect_insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    created = 0
+    for i in range(0, len(rows), QR_INSERT_CHUNK_SIZE):
+        chunk = rows[i:i + QR_INSERT_CHUNK_SIZE]
+        if dialect_insert is not None:
+            stmt = dialect_insert(QRCode).values(chunk).on_conflict_do_nothing(index_elements=['date'])
+            created += db.session.execute(stmt).rowcount
+        else:
+            # Other databases: insert row by row and skip days created concurrently
+            for row in chunk:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(QRCode).values(**row))
+                    created += 1
+                except IntegrityError:
+                    pass
+
+    db.session.commit()
+    invalidate_today_qr_cache()
+    logging.info(f"Generated {created} QR codes for {start_date} to {end_date}")
+    return created
+
 def generate_monthly_qr_codes():
     """Generate QR codes for the entire month"""
-    current_date = date.today()
+    current_date = ist_today()
     start_of_month = current_date.replace(day=1)
     
     # Calculate the last day of the month
@@ -23,48 +100,101 @@ def generate_monthly_qr_codes():
     else:
         end_of_month = start_of_month.replace(month=current_date.month + 1) - timedelta(days=1)
     
-    generated_codes = []
-    current_day = start_of_month
-    
-    while current_day <= end_of_month:
-        # Check if QR code already exists for this date
-        existing_qr = QRCode.query.filter_by(date=current_day).first()
-        
-        if not existing_qr:
-            # Generate new QR code
-            qr_string = generate_qr_code_string()
-            
-            new_qr = QRCode(
-                code=qr_string,
-                date=current_day,
-                is_active=True
-            )
-            
-            db.session.add(new_qr)
-            generated_codes.append(new_qr)
-            
-            logging.info(f"Generated QR code for {current_day}: {qr_string}")
-        
-        current_day += timedelta(days=1)
-    
+    return generate_qr_codes(start_of_month, end_of_month)
+
+def deactivate_qr_code(qr_date):
+    """Deactivate the QR code for a date so it can no longer be scanned"""
+    qr_code = QRCode.query.filter_by(date=qr_date, is_active=True).first()
+    if not qr_code:
+        return None
+
+    qr_code.is_active = False
     db.session.commit()
-    return generated_codes
+    invalidate_today_qr_cache()
+    logging.info(f"Deactivated QR code for {qr_date}")
+    return qr_code
 
 def get_today_qr_code():
     """Get the QR code for today"""
-    today = date.today()
+    today = ist_today()
     return QRCode.query.filter_by(date=today, is_active=True).first()
 
-def create_qr_code_image(qr_string):
-    """Create QR code image (for display purposes)"""
-    import qrcode
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(qr_string)
-    qr.make(fit=True)
-    
-    return qr.make_image(fill_color="black", back_color="white")
+def get_today_qr_cached():
+    """Get today's QR code (id and code) from the process-local cache"""
+    today = ist_today()
+    now = time.monotonic()
+
+    with _today_qr_lock:
+        if (_today_qr_cache['date'] == today and
+                now - _today_qr_cache['loaded_at'] < QR_CACHE_TTL):
+            return _today_qr_cache['qr']
+
+        row = db.session.query(QRCode.id, QRCode.code).filter_by(
+            date=today, is_active=True
+        ).first()
+        cached = CachedQR(row.id, row.code) if row else None
+
+        _today_qr_cache.update(date=today, qr=cached, loaded_at=now)
+        return cached
+
+def invalidate_today_qr_cache():
+    """Drop the cached QR row so the next lookup reads the database"""
+    with _today_qr_lock:
+        _today_qr_cache.update(date=None, qr=None, loaded_at=0.0)
+
+def verify_today_qr_code(scanned_code):
+    """Return today's cached QR code if scanned_code is valid for it, else None"""
+    # JSON bodies can carry numbers or lists; those are never a valid code
+    if not scanned_code or not isinstance(scanned_code, str):
+        return None
+
+    # Rotating tokens are checked before touching the cache; static codes are
+    # not accepted in this mode, since they are what gets photographed
+    if QR_ROTATING:
+        if not verify_rotating_token(scanned_code):
+            return None
+        return get_today_qr_cached()
+
+    today_qr = get_today_qr_cached()
+    if not today_qr:
+        return None
+
+    # Constant-time comparison so response timing does not leak the code
+    if not hmac.compare_digest(today_qr.code.encode(), scanned_code.encode()):
+        return None
+    return today_qr
+
+def _day_secret(day):
+    """Per-day key for rotating tokens, derived from the app secret"""
+    return hmac.new(current_app.secret_key.encode(), f"qr-rotation:{day.isoformat()}".encode(),
+                    hashlib.sha256).digest()
+
+def _token_mac(day, step):
+    return hmac.new(_day_secret(day), str(step).encode(), hashlib.sha256).hexdigest()[:16]
+
+def current_rotation_step(now=None):
+    """Index of the rotation period containing now (unix time)"""
+    now = time.time() if now is None else now
+    return int(now // QR_ROTATION_SECONDS)
+
+def current_rotating_token(now=None):
+    """Today's token for the current step and the seconds until it rotates"""
+    now = time.time() if now is None else now
+    step = current_rotation_step(now)
+    expires_in = QR_ROTATION_SECONDS - (now % QR_ROTATION_SECONDS)
+    return f"{step}.{_token_mac(ist_today(), step)}", expires_in
+
+def verify_rotating_token(token, now=None):
+    """Check a 'step.mac' token for today without any database access"""
+    if not isinstance(token, str):
+        return False
+    step_str, _, mac = token.partition('.')
+    # ASCII digits only, and short enough that int() is cheap and never raises
+    if not (step_str.isascii() and step_str.isdigit()) or len(step_str) > 12 or not mac:
+        return False
+
+    step = int(step_str)
+    current_step = current_rotation_step(now)
+    if not current_step - QR_TOLERANCE_STEPS <= step <= current_step:
+        return False
+    return hmac.compare_digest(_token_mac(ist_today(), step).encode(), mac.encode())
@@ -0,0 +1,516 @@
+"""
+Report rendering (HTML, Excel, PDF) from a precomputed ReportDataset.
+
+This module deliberately does not import the Flask app or the database, so
+report rendering can run in worker processes (see render_reports). openpyxl
+and ReportLab are imported by the renderers on first use, which keeps them
+out of app startup.
+"""
+import functools
+import itertools
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+# Only the standard library and pytz, so safe to import in worker processes
+from attendance_policy import utc_to_ist
+import logging
+
+# Report rendering pool. REPORT_WORKERS=0 renders in the calling thread.
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "3"))
+REPORT_TIMEOUT = int(os.getenv("REPORT_TIMEOUT", "120"))
+
+# One faculty member's line in a daily report
+ReportRow = namedtuple('ReportRow', ['name', 'username', 'department', 'status', 'scan_time'])
+
+class ReportDataset(namedtuple('ReportDataset', ['report_date', 'present', 'absent'])):
+    """Precomputed rows for a daily report, shared by the HTML, Excel and PDF renderers"""
+    __slots__ = ()
+
+    @property
+    def total(self):
+        return len(self.present) + len(self.absent)
+
+    @property
+    def attendance_rate(self):
+        return (len(self.present) / self.total * 100) if self.total > 0 else 0
+
+def format_scan_time(scan_time):
+    """Format a stored (UTC) scan time for display in IST"""
+    if scan_time is None:
+        return 'N/A'
+    return utc_to_ist(scan_time).strftime('%I:%M %p IST')
+
+# Report column layout and shared Excel styles. Write-only worksheets store a
+# style reference per cell, so one instance of each style serves every row.
+EXCEL_HEADERS = ['S.No', 'Faculty Name', 'Username', 'Department', 'Status', 'Scan Time']
+EXCEL_COLUMN_WIDTHS = [8, 25, 15, 20, 12, 20]
+
+ExcelStyles = namedtuple('ExcelStyles', ['title_font', 'bold_font', 'center', 'header_fill', 'status_fills'])
+
+@functools.lru_cache(maxsize=None)
+def excel_styles():
+    """The shared Excel styles, built on first use"""
+    from openpyxl.styles import Font, PatternFill, Alignment
+    return ExcelStyles(
+        title_font=Font(size=16, bold=True),
+        bold_font=Font(bold=True),
+        center=Alignment(horizontal='center'),
+        header_fill=PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid"),
+        status_fills={
+            'Present': PatternFill(start_color="E6FFE6", end_color="E6FFE6", fill_type="solid"),
+            'Absent': PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid"),
+        },
+    )
+
+def write_excel_report(stream, title, rows):
+    """Stream an attendance workbook into a binary stream.
+
+    rows is any iterable of ReportRow; they are written one at a time with a
+    write-only worksheet, so memory stays flat however many rows there are.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    styles = excel_styles()
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Attendance Report")
+
+    for i, width in enumerate(EXCEL_COLUMN_WIDTHS):
+        ws.column_dimensions[get_column_letter(i + 1)].width = width
+
+    def styled(value, font=None, fill=None, alignment=None):
+        cell = WriteOnlyCell(ws, value=value)
+        if font:
+            cell.font = font
+        if fill:
+            cell.fill = fill
+        if alignment:
+            cell.alignment = alignment
+        return cell
+
+    # Title
+    ws.append([styled(title, font=styles.title_font, alignment=styles.center)])
+    ws.merged_cells.add('A1:E1')
+    ws.append([])
+
+    # Headers
+    ws.append([styled(header, font=styles.bold_font, fill=styles.header_fill, alignment=styles.center)
+               for header in EXCEL_HEADERS])
+
+    # Data, color-coded by status
+    present_count = 0
+    absent_count = 0
+    for i, faculty in enumerate(rows, 1):
+        if faculty.status == 'Present':
+            present_count += 1
+        else:
+            absent_count += 1
+
+        fill = styles.status_fills.get(faculty.status)
+        ws.append([
+            styled(value, fill=fill)
+            for value in (i, faculty.name, faculty.username, faculty.department,
+                          faculty.status, faculty.scan_time)
+        ])
+
+    # Summary
+    total = present_count + absent_count
+    attendance_rate = (present_count / total * 100) if total > 0 else 0
+    ws.append([])
+    ws.append([])
+    ws.append([styled('Summary', font=styles.bold_font)])
+    ws.append([f'Total Faculty: {total}'])
+    ws.append([f'Present: {present_count}'])
+    ws.append([f'Absent: {absent_count}'])
+    ws.append([f'Attendance Rate: {attendance_rate:.1f}%'])
+
+    wb.save(stream)
+
+def generate_excel_report(dataset):
+    """Generate Excel report for attendance, returned as bytes"""
+    title = f"Daily Attendance Report - {dataset.report_date.strftime('%B %d, %Y')}"
+    buffer = BytesIO()
+    write_excel_report(buffer, title, itertools.chain(dataset.present, dataset.absent))
+    return buffer.getvalue()
+
+def generate_pdf_report(dataset):
+    """Generate PDF report for attendance, returned as bytes"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    today = dataset.report_date
+    present_faculty = dataset.present
+    absent_faculty = dataset.absent
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    story = []
+    
+    # Styles
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        alignment=1,  # Center
+        spaceAfter=30
+    )
+    
+    # Title
+    title = Paragraph(f"Daily Attendance Report - {today.strftime('%B %d, %Y')}", title_style)
+    story.append(title)
+    
+    # Present Faculty Table
+    if present_faculty:
+        story.append(Paragraph("Present Faculty", styles['Heading2']))
+        present_data = [['S.No', 'Faculty Name', 'Username', 'Department', 'Scan Time']]
+        
+        for i, faculty in enumerate(present_faculty, 1):
+            present_data.append([
+                str(i),
+                faculty.name,
+                faculty.username,
+                faculty.department,
+                faculty.scan_time
+            ])
+        
+        present_table = Table(present_data)
+        present_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.lightgreen),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        story.append(present_table)
+        story.append(Spacer(1, 20))
+    
+    # Absent Faculty Table
+    if absent_faculty:
+        story.append(Paragraph("Absent Faculty", styles['Heading2']))
+        absent_data = [['S.No', 'Faculty Name', 'Username', 'Department']]
+        
+        for i, faculty in enumerate(absent_faculty, 1):
+            absent_data.append([
+                str(i),
+                faculty.name,
+                faculty.username,
+                faculty.department
+            ])
+        
+        absent_table = Table(absent_data)
+        absent_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.lightcoral),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        story.append(absent_table)
+        story.append(Spacer(1, 20))
+    
+    # Summary
+    story.append(Paragraph("Summary", styles['Heading2']))
+    
+    summary_data = [
+        ['Total Faculty', str(dataset.total)],
+        ['Present', str(len(present_faculty))],
+        ['Absent', str(len(absent_faculty))],
+        ['Attendance Rate', f'{dataset.attendance_rate:.1f}%']
+    ]
+    
+    summary_table = Table(summary_data)
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.lightblue),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    story.append(summary_table)
+    
+    # Build PDF
+    doc.build(story)
+    return buffer.getvalue()
+
+def generate_html_report(dataset):
+    """Generate the HTML email body for attendance"""
+    today = dataset.report_date
+        
+    html_body = f"""
+        <html>
+        <body>
+            <h2>Daily Attendance Report</h2>
+            <p><strong>Date:</strong> {today.strftime('%B %d, %Y')}</p>
+            
+            <h3>Present Faculty ({len(dataset.present)})</h3>
+            <ul>
+        """
+        
+    html_body += ''.join(
+        f"<li>{faculty.name} ({faculty.username}) - {faculty.department} - Scanned at: {faculty.scan_time}</li>"
+        for faculty in dataset.present
+    )
+        
+    html_body += """
+            </ul>
+            
+            <h3>Absent Faculty ({})</h3>
+            <ul>
+        """.format(len(dataset.absent))
+        
+    html_body += ''.join(
+        f"<li>{faculty.name} ({faculty.username}) - {faculty.department}</li>"
+        for faculty in dataset.absent
+    )
+        
+    html_body += """
+            </ul>
+            
+            <p><strong>Total Faculty:</strong> {}</p>
+            <p><strong>Present:</strong> {}</p>
+            <p><strong>Absent:</strong> {}</p>
+            <p><strong>Attendance Rate:</strong> {:.1f}%</p>
+            
+            <hr>
+            <p><em>This is an automated email from the Smart Attendance System.</em></p>
+        </body>
+        </html>
+        """.format(
+        dataset.total,
+        len(dataset.present),
+        len(dataset.absent),
+        dataset.attendance_rate
+    )
+
+    return html_body
+
+# One faculty member's line in a date-range report; working_days counts only
+# the days since the faculty member registered
+RangeReportRow = namedtuple('RangeReportRow', [
+    'name', 'username', 'department', 'present_days', 'absent_days', 'working_days',
+    'attendance_rate', 'first_scan', 'last_scan'
+])
+
+class RangeReportDataset(namedtuple('RangeReportDataset', ['start_date', 'end_date', 'working_days', 'rows'])):
+    """Per-faculty attendance totals over a date range"""
+    __slots__ = ()
+
+    @property
+    def title(self):
+        if self.start_date == self.end_date:
+            return f"Attendance Report - {self.start_date.strftime('%B %d, %Y')}"
+        return (f"Attendance Report - {self.start_date.strftime('%B %d, %Y')} "
+                f"to {self.end_date.strftime('%B %d, %Y')}")
+
+    @property
+    def overall_rate(self):
+        possible = sum(row.working_days for row in self.rows)
+        present = sum(row.present_days for row in self.rows)
+        return (present / possible * 100) if possible > 0 else 0
+
+RANGE_HEADERS = ['S.No', 'Faculty Name', 'Username', 'Department', 'Present', 'Absent',
+                 'Attendance %', 'First Scan', 'Last Scan']
+RANGE_COLUMN_WIDTHS = [8, 25, 15, 20, 10, 10, 14, 24, 24]
+
+def format_scan_datetime(scan_time):
+    """Format a stored (UTC) scan time as an IST date and time"""
+    if scan_time is None:
+        return 'N/A'
+    return utc_to_ist(scan_time).strftime('%d %b %Y %I:%M %p IST')
+
+def _range_row_values(i, row):
+    return (i, row.name, row.username, row.department, row.present_days, row.absent_days,
+            f'{row.attendance_rate:.1f}%', row.first_scan, row.last_scan)
+
+def write_range_excel_report(stream, dataset):
+    """Stream a date-range attendance workbook into a binary stream"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    styles = excel_styles()
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Attendance Summary")
+
+    for i, width in enumerate(RANGE_COLUMN_WIDTHS):
+        ws.column_dimensions[get_column_letter(i + 1)].width = width
+
+    def styled(value, font=None, fill=None, alignment=None):
+        cell = WriteOnlyCell(ws, value=value)
+        if font:
+            cell.font = font
+        if fill:
+            cell.fill = fill
+        if alignment:
+            cell.alignment = alignment
+        return cell
+
+    ws.append([styled(dataset.title, font=styles.title_font, alignment=styles.center)])
+    ws.merged_cells.add('A1:I1')
+    ws.append([f'Working days: {dataset.working_days}'])
+    ws.append([styled(header, font=styles.bold_font, fill=styles.header_fill, alignment=styles.center)
+               for header in RANGE_HEADERS])
+
+    for i, row in enumerate(dataset.rows, 1):
+        ws.append(list(_range_row_values(i, row)))
+
+    ws.append([])
+    ws.append([styled('Summary', font=styles.bold_font)])
+    ws.append([f'Total Faculty: {len(dataset.rows)}'])
+    ws.append([f'Overall Attendance Rate: {dataset.overall_rate:.1f}%'])
+
+    wb.save(stream)
+
+def generate_range_excel_report(dataset):
+    """Generate a date-range Excel report, returned as bytes"""
+    buffer = BytesIO()
+    write_range_excel_report(buffer, dataset)
+    return buffer.getvalue()
+
+def generate_range_pdf_report(dataset):
+    """Generate a date-range PDF report, returned as bytes"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4))
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        alignment=1,  # Center
+        spaceAfter=20
+    )
+
+    story = [
+        Paragraph(dataset.title, title_style),
+        Paragraph(f"Working days: {dataset.working_days}", styles['Normal']),
+        Spacer(1, 12),
+    ]
+
+    table_data = [RANGE_HEADERS]
+    table_data.extend([str(value) for value in _range_row_values(i, row)]
+                      for i, row in enumerate(dataset.rows, 1))
+
+    table = Table(table_data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+    ]))
+    story.append(table)
+    story.append(Spacer(1, 20))
+
+    summary_table = Table([
+        ['Total Faculty', str(len(dataset.rows))],
+        ['Working Days', str(dataset.working_days)],
+        ['Overall Attendance Rate', f'{dataset.overall_rate:.1f}%'],
+    ])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.lightblue),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    story.append(summary_table)
+
+    doc.build(story)
+    return buffer.getvalue()
+
+# Renderers run by render_reports, keyed by output name
+REPORT_RENDERERS = {
+    'html': generate_html_report,
+    'xlsx': generate_excel_report,
+    'pdf': generate_pdf_report,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def process_pool_context():
+    """Start method for worker pools.
+
+    The web process runs scheduler, mail and flusher threads and holds
+    database connections, so forking it could hand a child a lock that some
+    other thread held at the time. forkserver (spawn where unavailable)
+    starts workers from a clean interpreter instead.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def get_report_executor():
+    """Process pool shared by all report renders, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=REPORT_WORKERS, mp_context=process_pool_context())
+        return _executor
+
+def _reset_report_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def render_reports(dataset, renderers=None, timeout=REPORT_TIMEOUT):
+    """Render a dataset with several renderers concurrently.
+
+    renderers maps output names to module-level render functions and
+    defaults to REPORT_RENDERERS (HTML body, XLSX and PDF). The dataset is
+    pickled to the pool's worker processes, so ReportLab's CPU-bound layout
+    does not compete with request threads for the GIL. Returns a dict keyed
+    like renderers. Raises TimeoutError if the renders take longer than
+    timeout seconds.
+    """
+    if renderers is None:
+        renderers = REPORT_RENDERERS
+    
+    if REPORT_WORKERS <= 0:
+        return {name: render(dataset) for name, render in renderers.items()}
+
+    try:
+        executor = get_report_executor()
+        futures = {name: executor.submit(render, dataset) for name, render in renderers.items()}
+    except (BrokenProcessPool, RuntimeError) as e:
+        # The pool died (e.g. a worker was OOM-killed); render inline this time
+        logging.error(f"Report pool unavailable, rendering inline: {e}")
+        _reset_report_executor()
+        return {name: render(dataset) for name, render in renderers.items()}
+
+    # One deadline for the whole batch, not one per renderer
+    _, not_done = wait(futures.values(), timeout=timeout)
+    if not_done:
+        for future in not_done:
+            future.cancel()
+        # A stuck worker would block later renders, so start a fresh pool
+        _reset_report_executor()
+        raise TimeoutError(f"Report rendering took longer than {timeout}s")
+
+    try:
+        return {name: future.result() for name, future in futures.items()}
+    except BrokenProcessPool:
+        _reset_report_executor()
+        raise
@@ -1,9 +1,9 @@
-from flask import render_template, request, redirect, url_for, flash, session, jsonify, send_file
-from werkzeug.security import check_password_hash, generate_password_hash
-from app import app, db
-from models import User, QRCode, Attendance, EmailLog
-from datetime import datetime, date, time
-import pytz
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, send_file,
+                   make_response, current_app)
+from app import db
+from models import User, QRCode, Attendance, EmailLog, FacultyImport
+from collections import namedtuple
+from datetime import datetime
 import logging
 from functools import wraps
 
@@ -11,26 +11,67 @@ def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session or session.get('role') != 'admin':
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
 
-# Indian Standard Time
-IST = pytz.timezone('Asia/Kolkata')
-from qr_service import generate_monthly_qr_codes, get_today_qr_code, create_qr_code_image
-from email_service import send_attendance_email
+# The user's details are kept in the signed session cookie from login on, so
+# pages need no user lookup. Accounts are never edited after registration,
+# so the copy does not go stale.
+SessionUser = namedtuple('SessionUser', ['id', 'username', 'role', 'full_name', 'department', 'email'])
 
-@app.route('/')
+def remember_user(user):
+    """Store the logged-in user's details in the session"""
+    session['user_id'] = user.id
+    session['username'] = user.username
+    session['role'] = user.role
+    session['full_name'] = user.full_name
+    session['department'] = user.department
+    session['email'] = user.email
+
+def current_user():
+    """The logged-in user as a SessionUser, or None"""
+    if 'user_id' not in session:
+        return None
+    if 'email' not in session:
+        # Logged in before the details were kept in the session
+        user = db.session.get(User, session['user_id'])
+        if user is None:
+            session.clear()
+            return None
+        remember_user(user)
+    return SessionUser(session['user_id'], session['username'], session['role'],
+                       session.get('full_name'), session.get('department'), session['email'])
+
+from qr_service import (generate_monthly_qr_codes, generate_qr_codes, get_today_qr_code,
+                        deactivate_qr_code, verify_today_qr_code, current_rotating_token,
+                        QR_ROTATING, QR_ROTATION_SECONDS)
+from qr_images import qr_image_cache, QR_IMAGE_DEFAULT_SIZE
+from email_service import build_range_dataset, month_date_range
+from mail_queue import enqueue_attendance_report
+from report_render import render_reports, generate_range_excel_report, generate_range_pdf_report
+from attendance_service import mark_attendance
+from write_behind import write_behind_queue
+from live_stats import live_stats
+from live_events import broadcaster, publish_scan, streaming_supported, LIVE_RELOAD_SECONDS
+from faculty_import import read_roster, start_import, import_result
+from passwords import hash_password, verify_password
+from attendance_policy import attendance_policy, ist_now, ist_today
+from attendance_history import (history_etag, history_page, monthly_summaries, history_slots,
+                                HISTORY_PAGE_SIZE)
+
+bp = Blueprint('main', __name__)
+
+@bp.route('/')
 def index():
     if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user.role == 'admin':
-            return redirect(url_for('admin_dashboard'))
+        if session.get('role') == 'admin':
+            return redirect(url_for('main.admin_dashboard'))
         else:
-            return redirect(url_for('faculty_dashboard'))
-    return redirect(url_for('login'))
+            return redirect(url_for('main.faculty_dashboard'))
+    return redirect(url_for('main.login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
@@ -38,48 +79,73 @@ def login():
         
         user = User.query.filter_by(username=username).first()
         
-        if user and check_password_hash(user.password_hash, password):
-            session['user_id'] = user.id
-            session['username'] = user.username
-            session['role'] = user.role
+        if user and verify_password(user, password):
+            # Saves the hash if verify_password upgraded it to the current policy
+            db.session.commit()
+            remember_user(user)
             
             if user.role == 'admin':
-                return redirect(url_for('admin_dashboard'))
+                return redirect(url_for('main.admin_dashboard'))
             else:
-                return redirect(url_for('faculty_dashboard'))
+                return redirect(url_for('main.faculty_dashboard'))
         else:
             flash('Invalid username or password', 'error')
     
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/admin/dashboard')
+@bp.route('/admin/dashboard')
 def admin_dashboard():
     if 'user_id' not in session or session.get('role') != 'admin':
-        return redirect(url_for('login'))
-    
-    # Get statistics
-    total_faculty = User.query.filter_by(role='faculty').count()
-    today_attendance = Attendance.query.filter_by(date=date.today()).count()
+        return redirect(url_for('main.login'))
     
-    # Get recent attendances
-    recent_attendances = db.session.query(Attendance, User).join(User).filter(
-        Attendance.date == date.today()
-    ).order_by(Attendance.scan_time.desc()).limit(10).all()
+    # Statistics come from the in-memory live counters, not the database
+    stats = live_stats.snapshot()
     
     return render_template('admin_dashboard.html', 
-                         total_faculty=total_faculty,
-                         today_attendance=today_attendance,
-                         recent_attendances=recent_attendances)
+                         total_faculty=stats['total_faculty'],
+                         today_attendance=stats['present'],
+                         attendance_rate=stats['attendance_rate'],
+                         recent_scans=stats['recent_scans'],
+                         live_stream=streaming_supported(request.environ),
+                         reload_seconds=LIVE_RELOAD_SECONDS)
+
+@bp.route('/admin/stream')
+@admin_required
+def admin_stream():
+    """Server-Sent Events feed of new scans and updated counts for the dashboard"""
+    from flask import Response
+    if not streaming_supported(request.environ):
+        # 204 tells EventSource to stop reconnecting
+        return '', 204
+    return Response(broadcaster.stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # let nginx pass events through immediately
+    })
 
-@app.route('/admin/register_faculty', methods=['GET', 'POST'])
+@bp.route('/metrics')
+def metrics():
+    """Prometheus metrics for this worker: admins, or a scraper sending METRICS_TOKEN"""
+    import hmac
+    import os
+    from metrics import registry
+    
+    token = os.environ.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not scraper and session.get('role') != 'admin':
+        return 'Forbidden', 403
+    
+    return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@bp.route('/admin/register_faculty', methods=['GET', 'POST'])
 def register_faculty():
     if 'user_id' not in session or session.get('role') != 'admin':
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     if request.method == 'POST':
         username = request.form['username']
@@ -101,24 +167,59 @@ def register_faculty():
                 email=email,
                 full_name=full_name,
                 department=department,
-                password_hash=generate_password_hash(password),
+                password_hash=hash_password(password),
                 role='faculty'
             )
             db.session.add(new_faculty)
             db.session.commit()
+            live_stats.add_faculty(new_faculty)
             flash(f'Faculty {full_name} registered successfully! Username: {username}, Password: {password}', 'success')
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('main.admin_dashboard'))
     
     return render_template('register_faculty.html')
 
-@app.route('/admin/generate_qr')
+@bp.route('/admin/import_faculty', methods=['GET', 'POST'])
+@admin_required
+def bulk_import_faculty():
+    """Register faculty in bulk from an uploaded CSV or XLSX roster"""
+    if request.method == 'POST':
+        roster = request.files.get('roster')
+        if not roster or not roster.filename:
+            flash('Choose a CSV or XLSX roster to import', 'error')
+        else:
+            # Only the file is read here; hashing and inserts run in the background
+            try:
+                records = list(read_roster(roster.stream, roster.filename))
+                job = start_import(current_app._get_current_object(), records, roster.filename)
+                flash(f'Importing {job.rows} row(s) from {roster.filename}', 'success')
+                return redirect(url_for('main.faculty_import_status', import_id=job.id))
+            except ValueError as e:
+                flash(f'Could not import roster: {str(e)}', 'error')
+            except Exception as e:
+                flash(f'Error importing roster: {str(e)}', 'error')
+                logging.error(f"Faculty import error: {e}")
+    
+    return render_template('import_faculty.html', job=None, result=None)
+
+@bp.route('/admin/import_faculty/<int:import_id>')
+@admin_required
+def faculty_import_status(import_id):
+    """Progress, then the outcome, of a background roster import"""
+    job = db.session.get(FacultyImport, import_id)
+    if not job:
+        flash('Import not found', 'error')
+        return redirect(url_for('main.bulk_import_faculty'))
+    
+    return render_template('import_faculty.html', job=job, result=import_result(job))
+
+@bp.route('/admin/generate_qr')
 def generate_qr():
     if 'user_id' not in session or session.get('role') != 'admin':
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     try:
-        qr_codes = generate_monthly_qr_codes()
-        flash(f'Generated {len(qr_codes)} QR codes for the month', 'success')
+        created = generate_monthly_qr_codes()
+        flash(f'Generated {created} QR codes for the month', 'success')
     except Exception as e:
         flash(f'Error generating QR codes: {str(e)}', 'error')
         logging.error(f"QR generation error: {e}")
@@ -126,63 +227,162 @@ def generate_qr():
     # Get today's QR code to display
     today_qr = get_today_qr_code()
     
-    return render_template('generate_qr.html', today_qr=today_qr)
+    return render_template('generate_qr.html', today_qr=today_qr,
+                           rotating_qr=QR_ROTATING, rotation_seconds=QR_ROTATION_SECONDS,
+                           window_text=attendance_policy.describe())
 
-@app.route('/faculty/dashboard')
+@bp.route('/faculty/dashboard')
 def faculty_dashboard():
     if 'user_id' not in session or session.get('role') != 'faculty':
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
-    user = User.query.get(session['user_id'])
+    user = current_user()
+    now = ist_now()
     
     # Check if user has already marked attendance today
     today_attendance = Attendance.query.filter_by(
         user_id=user.id,
-        date=date.today()
+        date=now.date()
     ).first()
     
-    # Check if current time is within attendance window (9:30 AM - 9:45 AM IST)
-    ist_now = datetime.now(IST)
-    current_time = ist_now.time()
-    attendance_start = time(9, 30)  # 9:30 AM
-    attendance_end = time(9, 45)    # 9:45 AM
-    
-    can_mark_attendance = (attendance_start <= current_time <= attendance_end) and not today_attendance
+    # Today's window for the user's department; None on weekends and holidays
+    window = attendance_policy.window_for(now.date(), user.department)
+    can_mark_attendance = attendance_policy.is_open(now, user.department) and not today_attendance
     
     return render_template('faculty_dashboard.html', 
                          user=user,
                          today_attendance=today_attendance,
                          can_mark_attendance=can_mark_attendance,
-                         current_time=current_time)
+                         current_time=now.time(),
+                         window=window,
+                         window_text=attendance_policy.describe(user.department))
 
-@app.route('/faculty/scan_qr')
-def scan_qr():
+def history_response(build, make_etag, as_json=False):
+    """Answer a history request: 304 if the client's copy is current, else build() with the ETag.
+
+    Runs in one of the limited history slots and answers 503 when they are
+    all taken, so history browsing cannot starve the scan requests.
+    """
+    if not history_slots.acquire(blocking=False):
+        if as_json:
+            return jsonify({'success': False, 'message': 'Busy, try again shortly'}), 503, {'Retry-After': '5'}
+        return 'Attendance history is busy, please try again in a few seconds', 503, {'Retry-After': '5'}
+    try:
+        etag = make_etag()
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(build())
+        response.set_etag(etag)
+        # Per-user data: browsers may keep it but must revalidate, shared caches must not
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    finally:
+        history_slots.release()
+
+def history_cursor():
+    """The ?before=YYYY-MM-DD keyset cursor, or None for the newest page"""
+    before = request.args.get('before')
+    return datetime.strptime(before, '%Y-%m-%d').date() if before else None
+
+@bp.route('/faculty/history')
+def attendance_history():
+    """The logged-in faculty member's attendance, newest first, with monthly summaries"""
     if 'user_id' not in session or session.get('role') != 'faculty':
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
-    # Check if current time is within attendance window (IST)
-    ist_now = datetime.now(IST)
-    current_time = ist_now.time()
-    attendance_start = time(9, 30)
-    attendance_end = time(9, 45)
+    try:
+        before = history_cursor()
+    except ValueError:
+        flash('Invalid history date', 'error')
+        return redirect(url_for('main.attendance_history'))
+    
+    user = current_user()
+    
+    def build():
+        return render_template('attendance_history.html',
+                               user=user,
+                               page=history_page(user.id, before),
+                               summaries=monthly_summaries(user.id),
+                               before=before)
+    
+    # Summaries also depend on the date and the working days in the policy
+    return history_response(build, lambda: history_etag(user.id, ist_today().isoformat(),
+                                                        attendance_policy.version))
+
+@bp.route('/api/attendance/history')
+def attendance_history_api():
+    """JSON page of the user's attendance; pass next_before back as ?before= for older days"""
+    if 'user_id' not in session or session.get('role') != 'faculty':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    try:
+        before = history_cursor()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'before must be YYYY-MM-DD'}), 400
+    limit = request.args.get('limit', HISTORY_PAGE_SIZE, type=int)
+    user_id = session['user_id']
+    
+    def build():
+        page = history_page(user_id, before, limit)
+        return jsonify({
+            'success': True,
+            'entries': [
+                {
+                    'date': entry.date.isoformat(),
+                    'scan_time': entry.scan_time.isoformat() if entry.scan_time else None,
+                    'status': entry.status,
+                }
+                for entry in page.entries
+            ],
+            'next_before': page.next_before.isoformat() if page.next_before else None,
+        })
+    
+    return history_response(build, lambda: history_etag(user_id), as_json=True)
+
+@bp.route('/api/attendance/summary')
+def attendance_summary_api():
+    """JSON monthly attendance summaries for the user, newest month first"""
+    if 'user_id' not in session or session.get('role') != 'faculty':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    user_id = session['user_id']
+    
+    def build():
+        return jsonify({
+            'success': True,
+            'months': [summary._asdict() for summary in monthly_summaries(user_id)],
+        })
+    
+    return history_response(build, lambda: history_etag(user_id, ist_today().isoformat(),
+                                                        attendance_policy.version), as_json=True)
+
+@bp.route('/faculty/scan_qr')
+def scan_qr():
+    if 'user_id' not in session or session.get('role') != 'faculty':
+        return redirect(url_for('main.login'))
     
-    if not (attendance_start <= current_time <= attendance_end):
-        flash('Attendance can only be marked between 9:30 AM and 9:45 AM (IST)', 'error')
-        return redirect(url_for('faculty_dashboard'))
+    # Check if the attendance window is open for the user's department
+    department = current_user().department
+    if not attendance_policy.is_open(department=department):
+        flash(f'Attendance can only be marked between {attendance_policy.describe(department)} (IST) '
+              f'on working days', 'error')
+        return redirect(url_for('main.faculty_dashboard'))
     
     # Check if already marked attendance today
     today_attendance = Attendance.query.filter_by(
         user_id=session['user_id'],
-        date=date.today()
+        date=ist_today()
     ).first()
     
     if today_attendance:
         flash('You have already marked attendance for today', 'error')
-        return redirect(url_for('faculty_dashboard'))
+        return redirect(url_for('main.faculty_dashboard'))
     
     return render_template('scan_qr.html')
 
-@app.route('/api/verify_qr', methods=['POST'])
+@bp.route('/api/verify_qr', methods=['POST'])
 def verify_qr():
     if 'user_id' not in session or session.get('role') != 'faculty':
         return jsonify({'success': False, 'message': 'Unauthorized'})
@@ -193,100 +393,250 @@ def verify_qr():
     if not scanned_code:
         return jsonify({'success': False, 'message': 'No QR code provided'})
     
-    # Check if current time is within attendance window (IST)
-    ist_now = datetime.now(IST)
-    current_time = ist_now.time()
-    attendance_start = time(9, 30)
-    attendance_end = time(9, 45)
-    
-    if not (attendance_start <= current_time <= attendance_end):
-        return jsonify({'success': False, 'message': 'Attendance window closed (9:30-9:45 AM IST)'})
+    # Check if the attendance window is open for the user's department
+    department = current_user().department
+    now = ist_now()
+    if not attendance_policy.is_open(now, department):
+        return jsonify({'success': False,
+                        'message': f'Attendance window closed ({attendance_policy.describe(department)} IST)'})
     
-    # Verify QR code
-    today_qr = get_today_qr_code()
-    if not today_qr or today_qr.code != scanned_code:
+    # Verify QR code against the cached copy of today's row
+    today_qr = verify_today_qr_code(scanned_code)
+    if not today_qr:
         return jsonify({'success': False, 'message': 'Invalid QR code'})
     
-    # Check if already marked attendance
-    existing_attendance = Attendance.query.filter_by(
-        user_id=session['user_id'],
-        date=date.today()
-    ).first()
+    # Mark attendance; the unique (user_id, date) index rejects duplicates
+    if write_behind_queue is not None:
+        marked = write_behind_queue.submit(session['user_id'], today_qr.id, now.date())
+    else:
+        marked = mark_attendance(session['user_id'], today_qr.id, now.date())
     
-    if existing_attendance:
+    if not marked:
         return jsonify({'success': False, 'message': 'Already marked attendance today'})
     
-    # Mark attendance
-    attendance = Attendance(
-        user_id=session['user_id'],
-        qr_code_id=today_qr.id,
-        date=date.today(),
-        status='present'
-    )
-    
-    db.session.add(attendance)
-    db.session.commit()
+    publish_scan(live_stats.record_scan(session['user_id']))
     
     return jsonify({'success': True, 'message': 'Attendance marked successfully'})
 
-@app.route('/admin/send_email')
+@bp.route('/admin/send_email')
 def send_email():
     if 'user_id' not in session or session.get('role') != 'admin':
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
+    # Rendering and SMTP happen on the mail queue worker, not in this request
     try:
-        result = send_attendance_email()
-        if result:
-            flash('Attendance email sent successfully', 'success')
-        else:
-            flash('Failed to send attendance email', 'error')
+        enqueue_attendance_report(ist_today())
+        flash('Attendance email queued for delivery', 'success')
     except Exception as e:
-        flash(f'Error sending email: {str(e)}', 'error')
-        logging.error(f"Email sending error: {e}")
+        flash(f'Error queueing email: {str(e)}', 'error')
+        logging.error(f"Email queueing error: {e}")
     
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/download_qr/<date_str>')
-def download_qr(date_str):
-    if 'user_id' not in session or session.get('role') != 'admin':
-        return redirect(url_for('login'))
-    
+@bp.route('/admin/reports')
+@admin_required
+def attendance_report():
+    """Per-faculty attendance totals for a month (?month=YYYY-MM) or date range (?start=&end=)"""
     try:
-        from datetime import datetime
-        qr_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        qr_code = QRCode.query.filter_by(date=qr_date).first()
-        
-        if not qr_code:
-            flash('QR code not found for this date', 'error')
-            return redirect(url_for('generate_qr'))
-        
-        # Create QR code image
-        qr_img = create_qr_code_image(qr_code.code)
+        if request.args.get('start') and request.args.get('end'):
+            start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+        else:
+            month = request.args.get('month') or ist_today().strftime('%Y-%m')
+            month_start = datetime.strptime(month, '%Y-%m').date()
+            start_date, end_date = month_date_range(month_start.year, month_start.month)
+    except ValueError:
+        flash('Invalid report dates', 'error')
+        return redirect(url_for('main.attendance_report'))
+    
+    if start_date > end_date:
+        flash('Start date must be on or before end date', 'error')
+        return redirect(url_for('main.attendance_report'))
+    
+    dataset = build_range_dataset(start_date, end_date)
+    
+    export_format = request.args.get('format', 'html')
+    if export_format in ('xlsx', 'pdf'):
+        renderers = {'xlsx': generate_range_excel_report, 'pdf': generate_range_pdf_report}
+        try:
+            content = render_reports(dataset, {export_format: renderers[export_format]})[export_format]
+        except Exception as e:
+            flash(f'Error generating report: {str(e)}', 'error')
+            logging.error(f"Range report error: {e}")
+            return redirect(url_for('main.attendance_report'))
         
-        # Save to BytesIO
+        mimetypes = {
+            'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            'pdf': 'application/pdf',
+        }
         from io import BytesIO
-        img_io = BytesIO()
-        qr_img.save(img_io, 'PNG')
-        img_io.seek(0)
-        
-        from flask import send_file
         return send_file(
-            img_io,
-            mimetype='image/png',
+            BytesIO(content),
+            mimetype=mimetypes[export_format],
             as_attachment=True,
-            download_name=f'qr_code_{date_str}.png'
+            download_name=f"attendance_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.{export_format}"
         )
+    
+    return render_template('attendance_report.html', dataset=dataset)
+
+@bp.route('/admin/generate_qr_range', methods=['POST'])
+@admin_required
+def generate_qr_range():
+    """Create QR codes for every day in a date range (e.g. an academic year)"""
+    try:
+        start_date = datetime.strptime(request.form.get('start', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.form.get('end', ''), '%Y-%m-%d').date()
+        created = generate_qr_codes(start_date, end_date)
+        flash(f'Generated {created} QR codes for {start_date} to {end_date}', 'success')
+    except ValueError as e:
+        flash(f'Invalid date range: {str(e)}', 'error')
+    except Exception as e:
+        flash(f'Error generating QR codes: {str(e)}', 'error')
+        logging.error(f"QR range generation error: {e}")
+    
+    return redirect(url_for('main.generate_qr'))
+
+@bp.route('/admin/deactivate_qr/<date_str>', methods=['POST'])
+@admin_required
+def deactivate_qr(date_str):
+    try:
+        qr_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        flash('Invalid date', 'error')
+        return redirect(url_for('main.generate_qr'))
+    
+    if deactivate_qr_code(qr_date):
+        flash(f'QR code for {date_str} deactivated', 'success')
+    else:
+        flash('No active QR code found for this date', 'error')
+    
+    return redirect(url_for('main.admin_dashboard'))
+
+def send_qr_image(date_str, as_attachment):
+    """Send the (cached) QR image for a date, honouring If-None-Match/If-Modified-Since"""
+    qr_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    qr_code = QRCode.query.filter_by(date=qr_date).first()
+    if not qr_code:
+        return None
+    
+    image_format = request.args.get('format', 'png')
+    size = request.args.get('size', QR_IMAGE_DEFAULT_SIZE, type=int)
+    rendered = qr_image_cache.get(qr_code.code, image_format, size)
+    
+    from io import BytesIO
+    response = send_file(
+        BytesIO(rendered.data),
+        mimetype=rendered.mimetype,
+        as_attachment=as_attachment,
+        download_name=f'qr_code_{date_str}.{image_format}',
+        etag=rendered.etag,
+        last_modified=qr_code.created_at,
+        conditional=True
+    )
+    # Clients revalidate with the ETag; shared caches must not keep the code
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@bp.route('/admin/download_qr/<date_str>')
+def download_qr(date_str):
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return redirect(url_for('main.login'))
+    
+    try:
+        response = send_qr_image(date_str, as_attachment=True)
+        if response is None:
+            flash('QR code not found for this date', 'error')
+            return redirect(url_for('main.generate_qr'))
+        return response
         
     except Exception as e:
         flash(f'Error downloading QR code: {str(e)}', 'error')
         logging.error(f"QR download error: {e}")
-        return redirect(url_for('generate_qr'))
+        return redirect(url_for('main.generate_qr'))
+
+@bp.route('/admin/qr_image/<date_str>')
+@admin_required
+def qr_image(date_str):
+    """Inline QR image for display (?format=png|svg&size=pixels)"""
+    try:
+        response = send_qr_image(date_str, as_attachment=False)
+    except ValueError:
+        return 'Invalid date or format', 400
+    if response is None:
+        return 'QR code not found', 404
+    return response
 
-@app.route('/admin/download_app')
+@bp.route('/admin/live_qr')
+@admin_required
+def live_qr():
+    """Current rotating token as an image; X-QR-Expires-In says when to fetch the next one"""
+    if not QR_ROTATING:
+        return 'Rotating QR codes are disabled (QR_ROTATING=0)', 404
+    
+    token, expires_in = current_rotating_token()
+    try:
+        rendered = qr_image_cache.get(token, request.args.get('format', 'svg'),
+                                      request.args.get('size', QR_IMAGE_DEFAULT_SIZE, type=int))
+    except ValueError:
+        return 'Invalid format', 400
+    
+    from flask import Response
+    return Response(rendered.data, mimetype=rendered.mimetype, headers={
+        'Cache-Control': 'no-store',
+        'X-QR-Expires-In': f'{expires_in:.1f}',
+    })
+
+@bp.route('/admin/export_qr')
+@admin_required
+def export_qr():
+    """All QR codes in a date range as one PDF (?format=pdf) or ZIP of PNGs (?format=zip)"""
+    try:
+        if request.args.get('start') and request.args.get('end'):
+            start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+        else:
+            today = ist_today()
+            start_date, end_date = month_date_range(today.year, today.month)
+    except ValueError:
+        flash('Invalid export dates', 'error')
+        return redirect(url_for('main.generate_qr'))
+    
+    from qr_export import stream_qr_pdf, stream_qr_zip, QR_EXPORT_MAX_DAYS
+    if (end_date - start_date).days >= QR_EXPORT_MAX_DAYS:
+        flash(f'Exports are limited to {QR_EXPORT_MAX_DAYS} days', 'error')
+        return redirect(url_for('main.generate_qr'))
+    
+    export_format = request.args.get('format', 'pdf')
+    if export_format not in ('pdf', 'zip'):
+        flash('Unsupported export format', 'error')
+        return redirect(url_for('main.generate_qr'))
+    
+    qr_codes = db.session.query(QRCode.date, QRCode.code).filter(
+        QRCode.date.between(start_date, end_date)
+    ).order_by(QRCode.date).all()
+    if not qr_codes:
+        flash('No QR codes found for this date range', 'error')
+        return redirect(url_for('main.generate_qr'))
+    
+    from flask import Response
+    stream = stream_qr_pdf(qr_codes) if export_format == 'pdf' else stream_qr_zip(qr_codes)
+    filename = f"qr_codes_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.{export_format}"
+    return Response(
+        stream,
+        mimetype='application/pdf' if export_format == 'pdf' else 'application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'Cache-Control': 'private, no-store',
+        }
+    )
+
+@bp.route('/admin/download_app')
 @admin_required
 def download_app():
     """Download the complete application as a ZIP file"""
     try:
+        import os
         import zipfile
         import tempfile
         from datetime import datetime
@@ -294,19 +644,15 @@ def download_app():
         # Create temporary ZIP file
         temp_zip = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
         
-        # Files to include in the download
-        files_to_include = [
-            'app.py', 'main.py', 'routes.py', 'models.py',
-            'email_service.py', 'qr_service.py', 'scheduler.py',
-            'setup.py', 'README.md'
-        ]
+        # Every module of the app, so the download stays importable as modules are added
+        files_to_include = sorted(file for file in os.listdir('.') if file.endswith('.py'))
+        files_to_include.append('README.md')
         
         # Template and static files
         template_files = []
         static_files = []
         
         # Get template files
-        import os
         if os.path.exists('templates'):
             for file in os.listdir('templates'):
                 if file.endswith('.html'):
@@ -362,7 +708,8 @@ For Gmail setup:
 - Use app password in .env file
 
 Email recipients can be changed in email_service.py
-Attendance window can be modified in routes.py and scheduler.py
+Attendance windows, weekends and holidays are set in
+instance/attendance_policy.json (see attendance_policy.py)
 """
             zipf.writestr('INSTALL.txt', install_txt)
         
@@ -382,7 +729,7 @@ Attendance window can be modified in routes.py and scheduler.py
     except Exception as e:
         flash(f'Error creating download: {str(e)}', 'error')
         logging.error(f"App download error: {e}")
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
 
 
 
@@ -1,48 +1,361 @@
-import schedule
-import time
+import heapq
+import itertools
+import os
+import socket
 import threading
-from datetime import datetime, time as dt_time
+import uuid
+from datetime import datetime, timedelta
 import pytz
-from email_service import send_attendance_email
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import JobRun, SchedulerLease
+from mail_queue import enqueue_attendance_report, enqueue_monthly_report
+from attendance_policy import attendance_policy, IST, utc_to_ist
 import logging
 
-# Indian Standard Time
-IST = pytz.timezone('Asia/Kolkata')
-
-def should_send_email():
-    """Check if it's time to send email in IST"""
-    now_ist = datetime.now(IST)
-    return now_ist.hour == 9 and now_ist.minute == 45
-
-def schedule_daily_email():
-    """Schedule daily email at 9:45 AM IST"""
-    last_sent_date = None
-    
-    while True:
-        now_ist = datetime.now(IST)
-        current_date = now_ist.date()
-        
-        # Check if it's 9:45 AM IST and we haven't sent today's email yet
-        if (now_ist.hour == 9 and now_ist.minute == 45 and 
-            last_sent_date != current_date):
-            
-            logging.info(f"Sending daily email at {now_ist.strftime('%Y-%m-%d %H:%M:%S IST')}")
-            success = send_attendance_email()
-            
-            if success:
-                last_sent_date = current_date
-                logging.info("Daily email sent successfully")
-            else:
-                logging.error("Failed to send daily email")
-        
-        time.sleep(60)  # Check every minute
-
-def start_scheduler():
-    """Start the scheduler in a separate thread"""
-    scheduler_thread = threading.Thread(target=schedule_daily_email, daemon=True)
-    scheduler_thread.start()
-    logging.info("Email scheduler started")
-
-# Auto-start scheduler when module is imported
-if __name__ != '__main__':
-    start_scheduler()
+# Upper bound on a single sleep, so wall-clock adjustments are noticed
+MAX_SLEEP_SECONDS = 3600
+
+# Set SCHEDULER_ENABLED=0 in processes that must never run jobs
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+# A leader that stops renewing is replaced after this long
+SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "60"))
+
+def _utcnow():
+    return datetime.now(pytz.UTC).replace(tzinfo=None)
+
+class LeaderLease:
+    """Leader election through a lease row in the database.
+
+    Every process that starts the scheduler runs a lease thread. The holder
+    renews the row every third of the lease; the others try to take it over
+    on the same cadence and succeed once it has expired, so a dead leader is
+    replaced within about one and a third lease periods.
+    """
+
+    def __init__(self, name, lease_seconds):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.app = None
+        self._leader = threading.Event()
+        self._thread = None
+        # Called whenever leadership is gained or lost
+        self.on_change = None
+
+    def try_acquire(self):
+        """Take or renew the lease. Returns True if this process is the leader."""
+        now = _utcnow()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        with self.app.app_context():
+            # Conditional UPDATE: renew our own lease or take over an expired one
+            result = db.session.execute(
+                db.update(SchedulerLease)
+                .where(
+                    SchedulerLease.name == self.name,
+                    db.or_(SchedulerLease.holder == self.holder, SchedulerLease.expires_at < now)
+                )
+                .values(holder=self.holder, expires_at=expires_at)
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                return True
+
+            if db.session.get(SchedulerLease, self.name) is not None:
+                return False
+
+            # First start: whoever inserts the row first leads
+            try:
+                db.session.add(SchedulerLease(name=self.name, holder=self.holder,
+                                              expires_at=expires_at, acquired_at=now))
+                db.session.commit()
+                return True
+            except IntegrityError:
+                db.session.rollback()
+                return False
+
+    def release(self):
+        """Give up the lease so another process can take over immediately"""
+        if not self._leader.is_set():
+            return
+        self._set_leader(False)
+        try:
+            with self.app.app_context():
+                db.session.execute(
+                    db.update(SchedulerLease)
+                    .where(SchedulerLease.name == self.name, SchedulerLease.holder == self.holder)
+                    .values(expires_at=_utcnow())
+                )
+                db.session.commit()
+        except Exception as e:
+            logging.error(f"Failed to release scheduler lease: {e}")
+
+    def is_leader(self):
+        return self._leader.is_set()
+
+    def _set_leader(self, leader):
+        if leader == self._leader.is_set():
+            return
+        if leader:
+            self._leader.set()
+            logging.info(f"Scheduler lease acquired by {self.holder}")
+        else:
+            self._leader.clear()
+            logging.info(f"Scheduler lease lost by {self.holder}")
+        if self.on_change:
+            self.on_change()
+
+    def _run(self):
+        while True:
+            try:
+                self._set_leader(self.try_acquire())
+            except Exception as e:
+                # Without a renewal we can no longer be sure we hold the lease
+                logging.error(f"Scheduler lease check failed: {e}")
+                self._set_leader(False)
+            threading.Event().wait(self.lease_seconds / 3)
+
+    def start(self, app):
+        if self._thread is not None:
+            return
+        self.app = app
+        self._thread = threading.Thread(target=self._run, name="scheduler-lease", daemon=True)
+        self._thread.start()
+
+class DailySchedule:
+    """Every day at a fixed IST time"""
+
+    def __init__(self, hour, minute):
+        self.hour = hour
+        self.minute = minute
+
+    def next_after(self, moment):
+        """First occurrence strictly after an aware datetime"""
+        local = moment.astimezone(IST)
+        day = local.date()
+        candidate = IST.localize(datetime(day.year, day.month, day.day, self.hour, self.minute))
+        if candidate <= local:
+            day += timedelta(days=1)
+            candidate = IST.localize(datetime(day.year, day.month, day.day, self.hour, self.minute))
+        return candidate
+
+class MonthlySchedule:
+    """A fixed day of every month at a fixed IST time"""
+
+    def __init__(self, day, hour, minute):
+        self.day = day
+        self.hour = hour
+        self.minute = minute
+
+    def next_after(self, moment):
+        local = moment.astimezone(IST)
+        year, month = local.year, local.month
+        while True:
+            candidate = IST.localize(datetime(year, month, self.day, self.hour, self.minute))
+            if candidate > local:
+                return candidate
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+class WindowCloseSchedule:
+    """When the last attendance window of each working day closes, per the attendance policy"""
+
+    # Give up looking for a working day after this many days
+    MAX_SEARCH_DAYS = 366
+
+    def next_after(self, moment):
+        local = moment.astimezone(IST)
+        day = local.date()
+        for _ in range(self.MAX_SEARCH_DAYS):
+            close = attendance_policy.latest_close(day)
+            if close is not None and close > local:
+                return close
+            day += timedelta(days=1)
+        # No working days at all; check again tomorrow
+        return local + timedelta(days=1)
+
+class Job:
+    """A registered job: what to run, when, and how late a missed run may still happen"""
+
+    def __init__(self, name, schedule, func, max_lateness, retry_delay=timedelta(minutes=5)):
+        self.name = name
+        self.schedule = schedule
+        self.func = func
+        self.max_lateness = max_lateness
+        self.retry_delay = retry_delay
+
+class JobScheduler:
+    """Heap-based scheduler that sleeps until the next due job.
+
+    The last completed occurrence of each job is stored in JobRun, so after a
+    restart missed occurrences (within the job's max_lateness) are run once
+    and nothing that already ran is repeated. Jobs only run while this
+    process holds the leader lease; a new leader picks up from JobRun.
+    """
+
+    def __init__(self, lease):
+        self.lease = lease
+        self.jobs = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.app = None
+        lease.on_change = self._wakeup.set
+
+    def register(self, name, schedule, func, max_lateness=timedelta(hours=12)):
+        """Register a job; func receives the scheduled occurrence (aware IST datetime)"""
+        job = Job(name, schedule, func, max_lateness)
+        with self._lock:
+            self.jobs[name] = job
+            if self.lease.is_leader():
+                occurrence = self._first_occurrence(job, datetime.now(IST))
+                self._push(occurrence, job, occurrence)
+        self._wakeup.set()
+        return job
+
+    def start(self, app):
+        if self._thread is not None:
+            return
+        self.app = app
+        self.lease.start(app)
+        self._thread = threading.Thread(target=self._run, name="job-scheduler", daemon=True)
+        self._thread.start()
+        logging.info(f"Job scheduler started with jobs: {', '.join(self.jobs)}")
+
+    def stop(self):
+        """Hand leadership to another process, e.g. on shutdown"""
+        self.lease.release()
+        self._wakeup.set()
+
+    # State
+
+    def _last_run(self, job):
+        with self.app.app_context():
+            job_run = db.session.get(JobRun, job.name)
+            if job_run is None:
+                return None
+            return utc_to_ist(job_run.last_run_at)
+
+    def _record_run(self, job, occurrence):
+        with self.app.app_context():
+            job_run = db.session.get(JobRun, job.name)
+            last_run_at = occurrence.astimezone(pytz.UTC).replace(tzinfo=None)
+            if job_run is None:
+                db.session.add(JobRun(name=job.name, last_run_at=last_run_at))
+            elif job_run.last_run_at < last_run_at:
+                job_run.last_run_at = last_run_at
+            db.session.commit()
+
+    def _first_occurrence(self, job, now):
+        """Oldest occurrence that still has to run: a missed one within max_lateness, or the next one"""
+        last_run = self._last_run(job)
+        earliest = now - job.max_lateness
+        start = max(last_run, earliest) if last_run else earliest
+        return job.schedule.next_after(start)
+
+    # Loop
+
+    def _push(self, run_at, job, occurrence):
+        heapq.heappush(self._heap, (run_at, next(self._seq), job.name, occurrence))
+
+    def _load(self):
+        """Fill the heap from persisted state when this process becomes leader"""
+        now = datetime.now(IST)
+        with self._lock:
+            self._heap.clear()
+            for job in self.jobs.values():
+                try:
+                    occurrence = self._first_occurrence(job, now)
+                except Exception as e:
+                    logging.error(f"Could not load state for job {job.name}: {e}")
+                    occurrence = job.schedule.next_after(now)
+                self._push(occurrence, job, occurrence)
+
+    def _run(self):
+        while True:
+            # Standby until this process holds the lease
+            while not self.lease.is_leader():
+                self._wakeup.wait()
+                self._wakeup.clear()
+
+            self._load()
+            self._run_as_leader()
+
+            with self._lock:
+                self._heap.clear()
+            logging.info("Job scheduler on standby")
+
+    def _run_as_leader(self):
+        while self.lease.is_leader():
+            with self._lock:
+                run_at, _, name, occurrence = self._heap[0] if self._heap else (None, None, None, None)
+
+            now = datetime.now(IST)
+            if run_at is None or run_at > now:
+                timeout = MAX_SLEEP_SECONDS if run_at is None else min(
+                    (run_at - now).total_seconds(), MAX_SLEEP_SECONDS)
+                # Also woken when the lease is lost or a job is registered
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+                continue
+
+            with self._lock:
+                heapq.heappop(self._heap)
+            self._run_job(self.jobs[name], occurrence, now)
+
+    def _run_job(self, job, occurrence, now):
+        if now - occurrence > job.max_lateness:
+            logging.warning(f"Skipping {job.name} for {occurrence:%Y-%m-%d %H:%M} IST: too late")
+            with self._lock:
+                self._push(job.schedule.next_after(now), job, job.schedule.next_after(now))
+            return
+
+        try:
+            logging.info(f"Running {job.name} for {occurrence:%Y-%m-%d %H:%M} IST")
+            with self.app.app_context():
+                job.func(occurrence)
+            self._record_run(job, occurrence)
+        except Exception as e:
+            logging.error(f"Job {job.name} failed: {e}")
+            with self._lock:
+                self._push(now + job.retry_delay, job, occurrence)
+            return
+
+        # Next occurrence after this one; catches up on any others that were missed
+        next_occurrence = job.schedule.next_after(occurrence)
+        with self._lock:
+            self._push(next_occurrence, job, next_occurrence)
+
+# Jobs
+
+def queue_daily_report(occurrence):
+    """Queue the day's attendance report once the last scan window of the day has closed"""
+    enqueue_attendance_report(occurrence.date())
+
+def queue_monthly_report(occurrence):
+    """Queue last month's attendance summary"""
+    last_month = occurrence.date().replace(day=1) - timedelta(days=1)
+    enqueue_monthly_report(last_month.year, last_month.month)
+
+def pregenerate_qr_codes(occurrence):
+    """Make sure the month's QR codes exist before anyone scans"""
+    from qr_service import generate_monthly_qr_codes
+    generate_monthly_qr_codes()
+
+job_scheduler = JobScheduler(LeaderLease('scheduler', SCHEDULER_LEASE_SECONDS))
+job_scheduler.register('daily_report', WindowCloseSchedule(), queue_daily_report,
+                       max_lateness=timedelta(hours=12))
+job_scheduler.register('monthly_report', MonthlySchedule(1, 10, 0), queue_monthly_report,
+                       max_lateness=timedelta(days=7))
+job_scheduler.register('qr_pregeneration', DailySchedule(0, 5), pregenerate_qr_codes,
+                       max_lateness=timedelta(days=1))
+
+def start_scheduler(app):
+    """Start the scheduler threads; jobs run in whichever process holds the lease"""
+    if not SCHEDULER_ENABLED:
+        logging.info("Job scheduler disabled (SCHEDULER_ENABLED=0)")
+        return
+    import atexit
+    job_scheduler.start(app)
+    atexit.register(job_scheduler.stop)
@@ -19,7 +19,6 @@ def install_requirements():
         'openpyxl==3.1.2',
         'reportlab==4.0.7',
         'gunicorn==21.2.0',
-        'schedule==1.2.0',
         'Pillow==10.1.0',
         'email-validator==2.1.0'
     ]
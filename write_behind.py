@@ -0,0 +1,290 @@
+"""
+Opt-in write-behind mode for attendance scans.
+
+Accepted scans are checked against an in-memory "already marked today" set,
+appended to a local journal (fsync'd) and acknowledged immediately. A
+background thread group-commits them to the Attendance table every
+ATTENDANCE_FLUSH_INTERVAL_MS milliseconds or ATTENDANCE_FLUSH_BATCH_SIZE rows,
+whichever comes first. Journal segments are deleted only after their rows are
+committed, and segments left behind by a crashed process are replayed on
+startup, so an acknowledged scan is never lost.
+
+Enable with ATTENDANCE_WRITE_BEHIND=1.
+"""
+import glob
+import json
+import os
+import threading
+from datetime import date, datetime, timezone
+from app import db
+from models import Attendance
+from attendance_service import insert_attendance_rows, mark_attendance
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+WRITE_BEHIND_ENABLED = os.getenv("ATTENDANCE_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+FLUSH_INTERVAL_MS = int(os.getenv("ATTENDANCE_FLUSH_INTERVAL_MS", "200"))
+FLUSH_BATCH_SIZE = int(os.getenv("ATTENDANCE_FLUSH_BATCH_SIZE", "200"))
+JOURNAL_DIR = os.getenv("ATTENDANCE_JOURNAL_DIR", os.path.join("instance", "attendance_journal"))
+
+
+class WriteBehindQueue:
+    """Buffers attendance inserts and flushes them in group commits"""
+
+    def __init__(self, journal_dir=JOURNAL_DIR, flush_interval_ms=FLUSH_INTERVAL_MS,
+                 batch_size=FLUSH_BATCH_SIZE):
+        self.journal_dir = journal_dir
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.batch_size = batch_size
+
+        self.app = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self._seen_date = None
+        self._seen_users = set()
+        self._pending = []
+
+        self._pid = os.getpid()
+        self._segment_seq = 0
+        self._journal = None
+        self._journal_path = None
+        self._sealed_segments = []
+        self._owner_lock = None
+
+    # Lifecycle
+
+    def start(self, app):
+        """Replay orphaned journals and start the background flusher"""
+        self.app = app
+        self._pid = os.getpid()
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._acquire_owner_lock()
+
+        with app.app_context():
+            self.replay_orphaned_journals()
+
+        self._open_segment()
+        self._thread = threading.Thread(target=self._run, name="attendance-write-behind", daemon=True)
+        self._thread.start()
+        logging.info(f"Attendance write-behind enabled (journal: {self.journal_dir})")
+
+    def stop(self):
+        """Flush everything still buffered and stop the flusher thread"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self.flush()
+
+        # Everything is committed, so the active segment and lock can go
+        with self._lock:
+            if self._journal and not self._pending:
+                self._journal.close()
+                _remove_quietly(self._journal_path)
+                if self._owner_lock:
+                    _remove_quietly(self._owner_lock.name)
+                    self._owner_lock.close()
+
+    # Hot path
+
+    def submit(self, user_id, qr_code_id, attendance_date, scan_time=None):
+        """Accept a scan. Returns False if the user was already marked for the date."""
+        if self._thread is None or self._stopping.is_set():
+            # No flusher in this process (not started, or shutting down): write directly
+            return mark_attendance(user_id, qr_code_id, attendance_date)
+
+        if scan_time is None:
+            scan_time = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        with self._lock:
+            if self._seen_date != attendance_date:
+                self._load_seen(attendance_date)
+
+            if user_id in self._seen_users:
+                return False
+
+            row = {
+                'user_id': user_id,
+                'qr_code_id': qr_code_id,
+                'date': attendance_date,
+                'scan_time': scan_time,
+                'status': 'present',
+            }
+            self._write_journal(row)
+            self._seen_users.add(user_id)
+            self._pending.append(row)
+            pending_count = len(self._pending)
+
+        if pending_count >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def forget_seen(self):
+        """Reload the already-marked users from the database on the next scan,
+        e.g. after attendance rows were deleted behind the queue's back"""
+        with self._lock:
+            self._seen_date = None
+
+    def _load_seen(self, attendance_date):
+        """Seed the already-marked set for a new day from the database"""
+        rows = db.session.query(Attendance.user_id).filter(Attendance.date == attendance_date).all()
+        self._seen_date = attendance_date
+        self._seen_users = {user_id for (user_id,) in rows}
+        self._seen_users.update(r['user_id'] for r in self._pending if r['date'] == attendance_date)
+
+    # Flushing
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Attendance write-behind flush failed: {e}")
+
+    def flush(self):
+        """Group-commit all buffered rows. Returns the number of rows inserted."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                rows, self._pending = self._pending, []
+                self._seal_segment()
+                segments = list(self._sealed_segments)
+
+            try:
+                with self.app.app_context():
+                    inserted = 0
+                    for start in range(0, len(rows), self.batch_size):
+                        inserted += insert_attendance_rows(rows[start:start + self.batch_size])
+                    db.session.commit()
+            except Exception:
+                # Keep the rows (and their journal segments) for the next attempt
+                with self._lock:
+                    self._pending = rows + self._pending
+                raise
+
+            with self._lock:
+                for path in segments:
+                    self._sealed_segments.remove(path)
+            for path in segments:
+                _remove_quietly(path)
+
+            logging.debug(f"Flushed {len(rows)} attendance rows ({inserted} new)")
+            return inserted
+
+    # Journal
+
+    def _acquire_owner_lock(self):
+        """Hold a lock file for our lifetime so replayers can tell we are alive"""
+        if fcntl is None:
+            return
+        path = os.path.join(self.journal_dir, f"worker-{self._pid}.lock")
+        self._owner_lock = open(path, 'w')
+        fcntl.flock(self._owner_lock, fcntl.LOCK_EX)
+
+    def _open_segment(self):
+        self._segment_seq += 1
+        self._journal_path = os.path.join(
+            self.journal_dir, f"journal-{self._pid}-{self._segment_seq:06d}.jsonl"
+        )
+        self._journal = open(self._journal_path, 'a', encoding='utf-8')
+
+    def _seal_segment(self):
+        """Close the active segment and start a new one (caller holds _lock)"""
+        self._journal.close()
+        self._sealed_segments.append(self._journal_path)
+        self._open_segment()
+
+    def _write_journal(self, row):
+        record = dict(row, date=row['date'].isoformat(), scan_time=row['scan_time'].isoformat())
+        self._journal.write(json.dumps(record) + '\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def replay_orphaned_journals(self):
+        """Insert rows from journal segments left behind by dead processes"""
+        replayed = 0
+        for pid, paths in _segments_by_pid(self.journal_dir).items():
+            # Our own pid here means a previous process that had the same pid
+            if pid != self._pid and not self._owner_is_dead(pid):
+                continue
+
+            rows = []
+            for path in paths:
+                rows.extend(_read_segment(path))
+
+            for start in range(0, len(rows), self.batch_size):
+                replayed += insert_attendance_rows(rows[start:start + self.batch_size])
+            db.session.commit()
+
+            for path in paths:
+                _remove_quietly(path)
+            if pid != self._pid:
+                _remove_quietly(os.path.join(self.journal_dir, f"worker-{pid}.lock"))
+
+        if replayed:
+            logging.warning(f"Replayed {replayed} attendance rows from orphaned journals")
+        return replayed
+
+    def _owner_is_dead(self, pid):
+        if fcntl is None:
+            # Without file locks only single-process deployments are supported,
+            # so any journal from another pid belongs to a previous run
+            return True
+
+        path = os.path.join(self.journal_dir, f"worker-{pid}.lock")
+        if not os.path.exists(path):
+            return True
+        with open(path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return True
+
+
+def _segments_by_pid(journal_dir):
+    segments = {}
+    for path in sorted(glob.glob(os.path.join(journal_dir, "journal-*-*.jsonl"))):
+        try:
+            pid = int(os.path.basename(path).split('-')[1])
+        except (IndexError, ValueError):
+            continue
+        segments.setdefault(pid, []).append(path)
+    return segments
+
+
+def _read_segment(path):
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn final line means the scan was never acknowledged
+                continue
+            record['date'] = date.fromisoformat(record['date'])
+            record['scan_time'] = datetime.fromisoformat(record['scan_time'])
+            rows.append(record)
+    return rows
+
+
+def _remove_quietly(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+write_behind_queue = WriteBehindQueue() if WRITE_BEHIND_ENABLED else None